@@ -0,0 +1,89 @@
+import re
+from sqlalchemy import text
+from models import db
+
+# External-content FTS5 table over analysis(instruction, content). The triggers
+# keep it in sync with every insert, update and delete, whichever code path
+# writes the rows.
+SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS analysis_fts USING fts5("
+    " instruction, content, content='analysis', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS analysis_fts_insert AFTER INSERT ON analysis BEGIN"
+    " INSERT INTO analysis_fts(rowid, instruction, content) VALUES (new.id, new.instruction, new.content);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS analysis_fts_delete AFTER DELETE ON analysis BEGIN"
+    " INSERT INTO analysis_fts(analysis_fts, rowid, instruction, content)"
+    " VALUES ('delete', old.id, old.instruction, old.content);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS analysis_fts_update AFTER UPDATE ON analysis BEGIN"
+    " INSERT INTO analysis_fts(analysis_fts, rowid, instruction, content)"
+    " VALUES ('delete', old.id, old.instruction, old.content);"
+    " INSERT INTO analysis_fts(rowid, instruction, content) VALUES (new.id, new.instruction, new.content);"
+    " END",
+)
+
+
+def init_search_index():
+    """Create the full-text index and its triggers, indexing existing rows the first time"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+
+    exists = db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'analysis_fts'"
+    )).first() is not None
+
+    for statement in SCHEMA:
+        db.session.execute(text(statement))
+    if not exists:
+        db.session.execute(text("INSERT INTO analysis_fts(analysis_fts) VALUES ('rebuild')"))
+    db.session.commit()
+    return True
+
+
+def build_match_query(query):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_analyses(user_id, query, analysis_type=None, video_id=None, limit=20):
+    """Return a user's analyses matching query, best first, with highlighted snippets"""
+    match = build_match_query(query)
+    if match is None:
+        return []
+
+    filters = ""
+    params = {'match': match, 'user_id': user_id, 'limit': limit}
+    if analysis_type:
+        filters += " AND a.type = :type"
+        params['type'] = analysis_type
+    if video_id:
+        filters += " AND a.video_id = :video_id"
+        params['video_id'] = video_id
+
+    # Matches in the instruction weigh twice as much as matches in the content
+    rows = db.session.execute(text(
+        "SELECT a.id, a.type, a.video_id, a.instruction, a.created_at,"
+        " bm25(analysis_fts, 2.0, 1.0) AS rank,"
+        " snippet(analysis_fts, 1, '**', '**', '...', 24) AS snippet"
+        " FROM analysis_fts JOIN analysis a ON a.id = analysis_fts.rowid"
+        " WHERE analysis_fts MATCH :match AND a.user_id = :user_id" + filters +
+        " ORDER BY rank LIMIT :limit"
+    ), params).mappings().all()
+
+    return [
+        {
+            'id': row['id'],
+            'type': row['type'],
+            'video_id': row['video_id'],
+            'instruction': row['instruction'],
+            'created_at': str(row['created_at']).replace(' ', 'T'),
+            'score': -row['rank'],
+            'snippet': row['snippet']
+        }
+        for row in rows
+    ]
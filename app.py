@@ -1,10 +1,33 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash, session
+from flask import Flask, Response, g, request, jsonify, render_template, redirect, url_for, flash, session, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from youtube_client import YouTubeClient
-from claude_client import ClaudeClient
-from models import db, User, Analysis
+from async_youtube_client import AsyncYouTubeClient, SyncYouTubeFacade
+from claude_client import AnalysisError, ClaudeClient
+from comment_clustering import MAX_CLUSTERS, cluster_comments, cluster_representatives, describe_clusters
+from comment_preprocessing import describe, preprocess_comments
+from engagement import engagement_metrics
+from models import db, User, Analysis, Job, TrackedItem
+from jobs import JobManager
+from metrics import (
+    APP_ERRORS, CACHE_HIT_RATIO, HTTP_LATENCY, HTTP_REQUESTS, REGISTRY, error_source, log_error, log_event, trace_id
+)
+from analysis_search import init_search_index, search_analyses
+from quota import QUOTA_COSTS, QuotaExceededError, error_reason, quota_feature
+from result_cache import ResultCache
+from tracking import TRACKED_KINDS, StatsTracker, growth_rates
+from transcript_pipeline import split_transcript
+from youtube_store import StatsStore
+from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.orm import defer
+import base64
+import itertools
+import json
+import math
 import os
+import time
+import uuid
 from datetime import datetime
 
 # Load environment variables
@@ -12,7 +35,7 @@ load_dotenv()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-this'  # Used for session security
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize database
@@ -21,6 +44,10 @@ db.init_app(app)
 # Create tables
 with app.app_context():
     db.create_all()
+    # create_all only adds missing tables, so add indexes introduced since a database was created
+    for index in Analysis.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    search_index_enabled = init_search_index()
 
 # Initialize login manager
 login_manager = LoginManager()
@@ -33,7 +60,90 @@ def load_user(user_id):
 
 # Initialize API clients
 youtube_client = YouTubeClient()
-claude_client = ClaudeClient()
+# Concurrent fan-out for multi-call flows; shares the sync client's cache, index and quota
+youtube_async = SyncYouTubeFacade(AsyncYouTubeClient(
+    cache=youtube_client.cache,
+    channel_index=youtube_client.channel_index,
+    scheduler=youtube_client.scheduler,
+    video_store=youtube_client.video_store
+))
+claude_client = ClaudeClient(result_cache=ResultCache())
+
+@app.before_request
+def start_request():
+    # Attribute YouTube quota spent while handling this request to its route
+    quota_feature.set(request.endpoint)
+    # Reuse the caller's request ID so logs can be joined across services
+    trace_id.set(request.headers.get('X-Request-ID') or uuid.uuid4().hex)
+    error_source.set(request_route())
+    g.started_at = time.perf_counter()
+
+def request_route():
+    # The URL rule (e.g. /api/video/<video_id>) keeps label values bounded
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.after_request
+def record_request(response):
+    # Streaming responses are timed up to their first byte
+    elapsed = time.perf_counter() - g.get('started_at', time.perf_counter())
+    route = request_route()
+    HTTP_LATENCY.observe(elapsed, route=route, method=request.method)
+    HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    log_event(
+        'request', method=request.method, route=route, path=request.path,
+        status=response.status_code, seconds=round(elapsed, 4),
+        user_id=current_user.get_id()
+    )
+    response.headers['X-Trace-ID'] = trace_id.get()
+    return response
+
+@app.teardown_request
+def record_error(error):
+    if error is not None:
+        APP_ERRORS.inc(route=request_route(), error=type(error).__name__)
+
+@app.errorhandler(QuotaExceededError)
+def handle_quota_exceeded(e):
+    APP_ERRORS.inc(route=request_route(), error=type(e).__name__)
+    return jsonify({'error': str(e), 'quota': youtube_client.scheduler.status()}), 429
+
+@app.errorhandler(HttpError)
+def handle_youtube_error(e):
+    APP_ERRORS.inc(route=request_route(), error=type(e).__name__)
+    return jsonify({'error': f'YouTube API error {e.resp.status}: {error_reason(e) or e.resp.reason}'}), 502
+
+@app.errorhandler(AnalysisError)
+def handle_analysis_error(e):
+    APP_ERRORS.inc(route=request_route(), error=type(e).__name__)
+    return jsonify({'error': str(e)}), 502
+
+def sse_response(chunks, meta=None):
+    """
+    Stream text chunks to the browser as server-sent events, ending with a
+    'done' event. Progress dicts from map-reduce analyses are sent as
+    'progress' events; a failure ends the stream with an 'error' event instead.
+    """
+    def generate():
+        if meta is not None:
+            yield f"event: meta\ndata: {json.dumps(meta)}\n\n"
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, dict):
+                    yield f"event: progress\ndata: {json.dumps(chunk)}\n\n"
+                elif chunk:
+                    yield f"data: {json.dumps({'text': chunk})}\n\n"
+        except Exception as e:
+            APP_ERRORS.inc(route=request_route(), error=type(e).__name__)
+            message = str(e) if isinstance(e, AnalysisError) else f"Error streaming analysis: {e}"
+            yield f"event: error\ndata: {json.dumps({'error': message})}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 # Authentication routes
 @app.route('/register', methods=['GET', 'POST'])
@@ -119,6 +229,7 @@ def search_videos():
     video_duration = data.get('videoDuration')
     published_after = data.get('publishedAfter')
     published_before = data.get('publishedBefore')
+    enrich = bool(data.get('enrich', False))
     
     videos = youtube_client.search_videos(
         query, 
@@ -126,7 +237,8 @@ def search_videos():
         order=order,
         video_duration=video_duration,
         published_after=published_after,
-        published_before=published_before
+        published_before=published_before,
+        enrich=enrich
     )
     
     return jsonify({'videos': videos})
@@ -151,6 +263,73 @@ def get_comments(video_id):
         'nextPageToken': next_page_token
     })
 
+# Comment pages hold 100 comments, so this is up to 1000 quota units
+MAX_CLUSTER_COMMENTS = 100000
+# Seconds the clusters route may spend harvesting; larger harvests belong in a job
+MAX_CLUSTER_TIME_BUDGET = 60
+
+@app.route('/api/video/<video_id>/comments/clusters', methods=['GET'])
+@login_required
+def get_comment_clusters(video_id):
+    """Group a video's comments into themes locally, with top terms and representative comments"""
+    max_comments = min(request.args.get('max_comments', 5000, type=int), MAX_CLUSTER_COMMENTS)
+    time_budget = min(max(request.args.get('time_budget', 30, type=float), 1), MAX_CLUSTER_TIME_BUDGET)
+    try:
+        k = int_param(request.args, 'k', None, 2, MAX_CLUSTERS)
+        representatives = int_param(request.args, 'representatives', 3, 1, 20)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    comments = youtube_client.iter_video_comments(
+        video_id,
+        max_comments=max_comments,
+        time_budget=time_budget,
+        include_replies=request.args.get('include_replies', 'false').lower() in ('1', 'true')
+    )
+    
+    stats = None
+    if request.args.get('preprocess', 'true').lower() in ('1', 'true'):
+        # Spam and filler would form clusters of their own; duplicates count through 'copies'
+        comments, stats = preprocess_comments(comments)
+    
+    result = cluster_comments(
+        comments,
+        k=k,
+        representatives=representatives
+    )
+    if not result['count']:
+        return jsonify({'error': 'No comments found'}), 404
+    
+    return jsonify(dict(result, preprocessing=stats))
+
+@app.route('/api/videos/comments', methods=['POST'])
+@login_required
+def get_comments_for_videos():
+    data = request.json
+    video_ids = data.get('video_ids') or []
+    try:
+        max_comments = int_param(data, 'max_comments', 100, 1, 1000)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not video_ids:
+        return jsonify({'error': 'Video IDs are required'}), 400
+    if len(video_ids) > 20:
+        return jsonify({'error': 'At most 20 videos per request'}), 400
+
+    time_budget = data.get('time_budget')
+    if time_budget is not None and not isinstance(time_budget, (int, float)):
+        return jsonify({'error': 'time_budget must be a number of seconds'}), 400
+
+    # Each video's comment pages are walked concurrently
+    comments = youtube_async.get_comments_for_videos(
+        video_ids,
+        max_comments=max_comments,
+        time_budget=time_budget,
+        include_replies=bool(data.get('include_replies', False))
+    )
+    return jsonify({'comments': comments})
+
 @app.route('/api/video/<video_id>/transcript', methods=['GET'])
 @login_required
 def get_video_transcript(video_id):
@@ -160,38 +339,63 @@ def get_video_transcript(video_id):
             'transcript': transcript
         })
     except Exception as e:
-        print(f"Error getting transcript: {e}")
+        log_error('transcript_error', e, video_id=video_id)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/analyze/transcript', methods=['POST'])
-@login_required
-def analyze_transcript():
-    data = request.json
+def load_transcript_analysis(data):
+    """Fetch the inputs for a transcript analysis; returns (args, early_response)"""
     video_id = data.get('video_id')
     instruction = data.get('instruction')
     
     if not video_id or not instruction:
-        return jsonify({'error': 'Missing video_id or instruction'}), 400
+        return None, (jsonify({'error': 'Missing video_id or instruction'}), 400)
     
+    # Get the timed transcript segments
+    segments, note = youtube_client.get_transcript_segments(video_id)
+    
+    if not segments:
+        return None, jsonify({'analysis': note})
+    
+    # Analyze the whole transcript in overlapping, timestamped windows
+    windows = split_transcript(segments)
+    return (windows, instruction), None
+
+def transcript_ranges(windows):
+    return [{'start': w['start'], 'end': w['end'], 'range': w['range']} for w in windows]
+
+@app.route('/api/analyze/transcript', methods=['POST'])
+@login_required
+def analyze_transcript():
     try:
-        # Get the transcript
-        transcript = youtube_client.get_video_transcript(video_id)
+        args, early_response = load_transcript_analysis(request.json)
+        if early_response:
+            return early_response
         
-        if transcript.startswith("Error") or transcript.startswith("No transcript"):
-            return jsonify({'analysis': transcript})
-        
-        # Analyze with Claude
-        analysis = claude_client.analyze_video_data(
-            {"transcript": transcript[:10000]},  # Limit to 10k chars to avoid token limits
-            instruction
-        )
+        windows, instruction = args
+        analysis = claude_client.analyze_transcript(windows, instruction)
         
         return jsonify({
-            'analysis': analysis
+            'analysis': analysis,
+            'segments': transcript_ranges(windows)
         })
+    except AnalysisError:
+        raise
     except Exception as e:
-        print(f"Error analyzing transcript: {e}")
+        log_error('transcript_error', e)
         return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analyze/transcript/stream', methods=['POST'])
+@login_required
+def analyze_transcript_stream():
+    args, early_response = load_transcript_analysis(request.json)
+    if early_response:
+        return early_response
+    
+    windows, instruction = args
+    return sse_response(
+        claude_client.stream_transcript(windows, instruction),
+        meta={'segments': transcript_ranges(windows)}
+    )
     
 @app.route('/api/search/channels', methods=['POST'])
 @login_required
@@ -218,90 +422,610 @@ def get_channel(channel_id):
     
     return jsonify({'channel': channel})
 
+# Enriching costs one videos.list call per 50 videos
+MAX_ENGAGEMENT_VIDEOS = 1000
+
 @app.route('/api/channel/<channel_id>/videos', methods=['GET'])
 @login_required
 def get_channel_videos(channel_id):
     max_results = request.args.get('maxResults', 10, type=int)
-    videos = youtube_client.get_channel_videos(channel_id, max_results=max_results)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    enrich = request.args.get('enrich', 'false').lower() in ('1', 'true')
+    videos = youtube_client.get_channel_videos(channel_id, max_results=max_results, enrich=enrich, offset=offset)
+    crawl = youtube_client.video_store.get_crawl(channel_id)
     
-    return jsonify({'videos': videos})    
+    return jsonify({
+        'videos': videos,
+        'stored': youtube_client.video_store.count(channel_id),
+        'complete': crawl['complete'] if crawl else False
+    })
 
-# Claude API routes
-@app.route('/api/analyze/video', methods=['POST'])
+@app.route('/api/channel/<channel_id>/engagement', methods=['GET'])
 @login_required
-def analyze_video():
-    # Increment analyses count
-    session['analyses_run'] = session.get('analyses_run', 0) + 1
-    data = request.json
+def get_channel_engagement(channel_id):
+    """Engagement ratios, views per day, outliers and percentile ranks across a channel's stored videos"""
+    max_results = min(request.args.get('maxResults', 200, type=int), MAX_ENGAGEMENT_VIDEOS)
+    outlier_z = request.args.get('z', 2.0, type=float)
+    videos = youtube_client.get_channel_videos(channel_id, max_results=max_results, enrich=True)
+    crawl = youtube_client.video_store.get_crawl(channel_id)
+    
+    if not videos and crawl is None:
+        return jsonify({'error': 'Channel not found'}), 404
+    
+    return jsonify(dict(
+        engagement_metrics(videos, outlier_z=outlier_z),
+        stored=youtube_client.video_store.count(channel_id),
+        complete=crawl['complete'] if crawl else False
+    ))
+
+# Uploads pages hold 50 videos, so a crawl job spends at most 1000 quota units
+MAX_CRAWL_PAGES = 1000
+
+@app.route('/api/channel/<channel_id>/crawl', methods=['POST'])
+@login_required
+def crawl_channel(channel_id):
+    """Index a channel's whole uploads playlist in the background; poll /api/jobs/<id>"""
+    data = request.get_json(silent=True) or {}
+    try:
+        max_pages = int_param(data, 'max_pages', None, 1, MAX_CRAWL_PAGES)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    params = {'channel_id': channel_id}
+    if max_pages is not None:
+        params['max_pages'] = max_pages
+    job = job_manager.submit(current_user.id, 'crawl', params)
+    
+    return jsonify({'job': job.to_dict()}), 202
+
+# Claude API routes
+def load_video_analysis(data):
+    """Fetch the inputs for a video analysis; returns (args, early_response)"""
     video_id = data.get('video_id')
     instruction = data.get('instruction')
     
     if not video_id or not instruction:
-        return jsonify({'error': 'Video ID and instruction are required'}), 400
+        return None, (jsonify({'error': 'Video ID and instruction are required'}), 400)
     
     video = youtube_client.get_video_details(video_id)
     
     if not video:
-        return jsonify({'error': 'Video not found'}), 404
+        return None, (jsonify({'error': 'Video not found'}), 404)
+    
+    return (video, instruction), None
+
+@app.route('/api/analyze/video', methods=['POST'])
+@login_required
+def analyze_video():
+    # Increment analyses count
+    session['analyses_run'] = session.get('analyses_run', 0) + 1
+    args, early_response = load_video_analysis(request.json)
+    if early_response:
+        return early_response
     
-    analysis = claude_client.analyze_video_data(video, instruction)
+    analysis = claude_client.analyze_video_data(*args)
     return jsonify({'analysis': analysis})
 
-@app.route('/api/analyze/comments', methods=['POST'])
+@app.route('/api/analyze/video/stream', methods=['POST'])
 @login_required
-def analyze_video_comments():
-    data = request.json
+def analyze_video_stream():
+    session['analyses_run'] = session.get('analyses_run', 0) + 1
+    args, early_response = load_video_analysis(request.json)
+    if early_response:
+        return early_response
+    
+    return sse_response(claude_client.stream_video_data(*args))
+
+# Bounds of the "token_budget" of preprocessed comments
+MIN_COMMENT_TOKENS = 500
+MAX_COMMENT_TOKENS = 200000
+
+def int_param(data, key, default, low, high):
+    """Integer request parameter clamped to [low, high]; raises ValueError if it is not an integer"""
+    value = data.get(key)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be an integer") from None
+    return min(max(value, low), high)
+
+def float_param(data, key, default, low, high):
+    """Number request parameter clamped to [low, high]; raises ValueError if it is not a number"""
+    value = data.get(key)
+    if value is None or value == '':
+        return default
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number") from None
+    if math.isnan(value):
+        raise ValueError(f"{key} must be a number")
+    return min(max(value, low), high)
+
+def load_comments_analysis(data):
+    """
+    Harvest and preprocess comments for an analysis; returns
+    ((comments, instruction, note, stats), early_response), where note tells
+    Claude how the comments were selected. With "preprocess": false the
+    comments are not filtered and note and stats are None. With
+    "mode": "clusters" only the representatives of locally found themes are sent.
+    """
     video_id = data.get('video_id')
     instruction = data.get('instruction')
     
-    print(f"Analyzing comments for video ID: {video_id}")
-    print(f"Instruction: {instruction}")
-    
     if not video_id or not instruction:
-        return jsonify({'error': 'Video ID and instruction are required'}), 400
+        return None, (jsonify({'error': 'Video ID and instruction are required'}), 400)
     
-    comments, _ = youtube_client.get_video_comments(video_id)
+    try:
+        token_budget = int_param(
+            data, 'token_budget', claude_client.comment_tokens, MIN_COMMENT_TOKENS, MAX_COMMENT_TOKENS
+        )
+        clusters = int_param(data, 'clusters', None, 2, MAX_CLUSTERS)
+        representatives = int_param(data, 'representatives', 5, 1, 20)
+        max_comments = int_param(data, 'max_comments', 1000, 1, MAX_CLUSTER_COMMENTS)
+        time_budget = float_param(data, 'time_budget', 10, 1, MAX_CLUSTER_TIME_BUDGET)
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
     
-    print(f"Number of comments retrieved: {len(comments)}")
+    # Harvest a sample across as many pages as the limits allow
+    comments = youtube_client.iter_video_comments(
+        video_id,
+        max_comments=max_comments,
+        time_budget=time_budget,
+        include_replies=bool(data.get('include_replies', False))
+    )
+    
+    first_comment = next(comments, None)
+    if first_comment is None:
+        return None, (jsonify({'error': 'No comments found'}), 404)
+    
+    comments = itertools.chain([first_comment], comments)
+    if data.get('mode') == 'clusters':
+        comments, stats = preprocess_comments(comments)
+        result = cluster_comments(
+            comments,
+            k=clusters,
+            representatives=representatives
+        )
+        if not result['clusters']:
+            return None, (jsonify({'error': 'No usable comments found', 'preprocessing': stats}), 404)
+        
+        stats['themes'] = [
+            {key: cluster[key] for key in ('theme', 'size', 'share', 'top_terms')} for cluster in result['clusters']
+        ]
+        note = describe(stats) + "\n" + describe_clusters(result)
+        return (cluster_representatives(result), instruction, note, stats), None
+    
+    if not data.get('preprocess', True):
+        # Comments stream from YouTube straight into the map-reduce chunks
+        return (comments, instruction, None, None), None
     
+    # Drop spam, filler and duplicates and sample what is left before any Claude call
+    comments, stats = preprocess_comments(comments, token_budget)
     if not comments:
-        return jsonify({'error': 'No comments found'}), 404
+        return None, (jsonify({'error': 'No usable comments found', 'preprocessing': stats}), 404)
     
-    print("Sending comments to Claude for analysis...")
-    analysis = claude_client.analyze_comments(comments, instruction)
-    print("Analysis received from Claude")
+    return (comments, instruction, describe(stats), stats), None
+
+@app.route('/api/analyze/comments', methods=['POST'])
+@login_required
+def analyze_video_comments():
+    args, early_response = load_comments_analysis(request.json)
+    if early_response:
+        return early_response
     
-    return jsonify({'analysis': analysis})
+    comments, instruction, note, stats = args
+    analysis = claude_client.analyze_comments_chunked(comments, instruction, note=note)
+    
+    return jsonify({'analysis': analysis, 'preprocessing': stats})
 
-@app.route('/api/analyze/channel', methods=['POST'])
+@app.route('/api/analyze/comments/stream', methods=['POST'])
 @login_required
-def analyze_channel():
-    data = request.json
+def analyze_video_comments_stream():
+    args, early_response = load_comments_analysis(request.json)
+    if early_response:
+        return early_response
+    
+    comments, instruction, note, stats = args
+    return sse_response(
+        claude_client.stream_comments_chunked(comments, instruction, note=note),
+        meta={'preprocessing': stats}
+    )
+
+def load_channel_analysis(data):
+    """Fetch the inputs for a channel analysis; returns (args, early_response)"""
     channel_id = data.get('channel_id')
     instruction = data.get('instruction')
     video_sample_size = data.get('video_sample_size', 5)
     
     if not channel_id or not instruction:
-        return jsonify({'error': 'Channel ID and instruction are required'}), 400
+        return None, (jsonify({'error': 'Channel ID and instruction are required'}), 400)
     
-    channel = youtube_client.get_channel_details(channel_id)
+    # Channel details and a sample of its videos, fetched concurrently once the
+    # uploads playlist is known, with statistics from one batched lookup
+    channel, videos = youtube_async.get_channel_bundle(
+        channel_id,
+        max_results=video_sample_size,
+        enrich=True
+    )
     
     if not channel:
-        return jsonify({'error': 'Channel not found'}), 404
-        
-    # Get a sample of videos from the channel
-    videos = youtube_client.get_channel_videos(channel_id, max_results=video_sample_size)
+        return None, (jsonify({'error': 'Channel not found'}), 404)
+    
+    return (channel, videos, instruction), None
+
+@app.route('/api/analyze/channel', methods=['POST'])
+@login_required
+def analyze_channel():
+    args, early_response = load_channel_analysis(request.json)
+    if early_response:
+        return early_response
     
     # Analyze with Claude
-    analysis = claude_client.analyze_channel_data(channel, videos, instruction)
+    analysis = claude_client.analyze_channel_data(*args)
     return jsonify({'analysis': analysis})
 
+@app.route('/api/analyze/channel/stream', methods=['POST'])
+@login_required
+def analyze_channel_stream():
+    args, early_response = load_channel_analysis(request.json)
+    if early_response:
+        return early_response
+    
+    return sse_response(claude_client.stream_channel_data(*args))
+
+MAX_COMPARE_VIDEOS = 50
+
+def load_compare_analysis(data):
+    """Fetch the videos for a comparative analysis; returns (args, early_response)"""
+    video_ids = data.get('video_ids') or []
+    query = data.get('query')
+    instruction = data.get('instruction')
+
+    if not (video_ids or query) or not instruction:
+        return None, (jsonify({'error': 'Video IDs or a search query, and an instruction, are required'}), 400)
+    if not isinstance(video_ids, list) or not all(isinstance(video_id, str) for video_id in video_ids):
+        return None, (jsonify({'error': 'video_ids must be a list of video IDs'}), 400)
+    if len(video_ids) > MAX_COMPARE_VIDEOS:
+        return None, (jsonify({'error': f'At most {MAX_COMPARE_VIDEOS} videos can be compared'}), 400)
+
+    if video_ids:
+        # One videos.list call per 50 IDs, with the chunks fetched concurrently
+        videos = youtube_async.get_videos_details(video_ids)
+    else:
+        try:
+            max_results = int_param(data, 'max_results', 10, 2, MAX_COMPARE_VIDEOS)
+        except ValueError as e:
+            return None, (jsonify({'error': str(e)}), 400)
+        videos = youtube_async.search_videos(query, max_results=max_results, enrich=True)
+
+    if len(videos) < 2:
+        return None, (jsonify({'error': 'At least two videos are needed for a comparison'}), 404)
+
+    return (videos, instruction), None
+
+@app.route('/api/analyze/compare', methods=['POST'])
+@login_required
+def analyze_compare():
+    args, early_response = load_compare_analysis(request.json)
+    if early_response:
+        return early_response
+
+    analysis = claude_client.analyze_multiple_videos(*args)
+    return jsonify({'analysis': analysis, 'videos': [video['id'] for video in args[0]]})
+
+@app.route('/api/analyze/compare/stream', methods=['POST'])
+@login_required
+def analyze_compare_stream():
+    args, early_response = load_compare_analysis(request.json)
+    if early_response:
+        return early_response
+
+    videos = [{'id': video['id'], 'title': video['title']} for video in args[0]]
+    return sse_response(claude_client.stream_multiple_videos(*args), meta={'videos': videos})
+
+# Background analysis jobs
+def early_result(early_response):
+    """Fail a job with the early response of a load_*_analysis helper; nothing was analyzed"""
+    response = early_response[0] if isinstance(early_response, tuple) else early_response
+    body = response.get_json()
+    # A transcript that cannot be fetched comes back as a note, not an error
+    raise ValueError(body.get('error') or body.get('analysis') or 'Analysis failed')
+
+def run_video_job(params):
+    args, early_response = load_video_analysis(params)
+    if early_response:
+        return early_result(early_response)
+    return {'analysis': claude_client.analyze_video_data(*args)}
+
+def run_comments_job(params):
+    args, early_response = load_comments_analysis(params)
+    if early_response:
+        return early_result(early_response)
+    comments, instruction, note, stats = args
+    return {
+        'analysis': claude_client.analyze_comments_chunked(comments, instruction, note=note),
+        'preprocessing': stats
+    }
+
+def run_channel_job(params):
+    args, early_response = load_channel_analysis(params)
+    if early_response:
+        return early_result(early_response)
+    return {'analysis': claude_client.analyze_channel_data(*args)}
+
+def run_transcript_job(params):
+    args, early_response = load_transcript_analysis(params)
+    if early_response:
+        return early_result(early_response)
+    windows, instruction = args
+    return {
+        'analysis': claude_client.analyze_transcript(windows, instruction),
+        'segments': transcript_ranges(windows)
+    }
+
+def run_crawl_job(params):
+    # Jobs submitted through /api/jobs skip the crawl route's validation
+    max_pages = int_param(params, 'max_pages', None, 1, MAX_CRAWL_PAGES)
+    summary = youtube_client.crawl_channel_uploads(params.get('channel_id'), max_pages=max_pages)
+    if summary is None:
+        raise ValueError('Channel not found')
+    return summary
+
+def quota_tagged(job_type, handler):
+    """Attribute YouTube quota spent by a job handler to its job type"""
+    def run(params):
+        quota_feature.set(f"job:{job_type}")
+        return handler(params)
+    return run
+
+job_manager = JobManager(
+    app,
+    {
+        job_type: quota_tagged(job_type, handler)
+        for job_type, handler in [
+            ('video', run_video_job),
+            ('comments', run_comments_job),
+            ('channel', run_channel_job),
+            ('transcript', run_transcript_job),
+            ('crawl', run_crawl_job)
+        ]
+    },
+    max_workers=int(os.environ.get('JOB_WORKERS', 4)),
+    max_per_user=int(os.environ.get('JOB_MAX_PER_USER', 2))
+)
+
+@app.cli.command('recover-jobs')
+def recover_jobs():
+    """Fail jobs interrupted by a restart; run once before starting the workers"""
+    print(f"Failed {job_manager.fail_interrupted()} interrupted jobs")
+
+@app.route('/api/jobs', methods=['POST'])
+@login_required
+def submit_job():
+    data = request.json
+    job_type = data.get('type')
+    
+    if job_type not in job_manager.handlers:
+        return jsonify({'error': 'Job type must be one of: ' + ', '.join(job_manager.handlers)}), 400
+    
+    # Saved analyses belong to a video
+    if data.get('save') and not data.get('video_id'):
+        return jsonify({'error': 'Only analyses of a video can be saved'}), 400
+    
+    params = {key: value for key, value in data.items() if key not in ('type', 'save')}
+    job = job_manager.submit(current_user.id, job_type, params, save=data.get('save', False))
+    
+    return jsonify({'job': job.to_dict()}), 202
+
+@app.route('/api/jobs', methods=['GET'])
+@login_required
+def get_jobs():
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    jobs = Job.query.filter_by(user_id=current_user.id).order_by(Job.created_at.desc()).limit(limit).all()
+    return jsonify({'jobs': [job.to_dict() for job in jobs]})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    job = Job.query.get_or_404(job_id)
+    
+    if job.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify({'job': job.to_dict()})
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+@login_required
+def get_job_result(job_id):
+    job = Job.query.get_or_404(job_id)
+    
+    if job.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if job.status == 'failed':
+        return jsonify({'job': job.to_dict(), 'error': job.error}), 500
+    
+    if job.status != 'done':
+        return jsonify({'job': job.to_dict()}), 202
+    
+    return jsonify({'job': job.to_dict(), 'result': json.loads(job.result)})
+
+# Statistics tracking routes
+MAX_TRACK_PER_REQUEST = 500
+
+stats_tracker = StatsTracker.from_env(app, youtube_client, StatsStore())
+
+def start_background_work():
+    """Resume queued jobs and start stats tracking; the serving entrypoint calls this once per process"""
+    job_manager.resume()
+    # Every server process starts a tracker; only the process holding the tracker lock file polls
+    stats_tracker.start()
+
+@app.route('/api/tracking', methods=['POST'])
+@login_required
+def track_items():
+    """Track videos and channels; each is checked and snapshotted right away"""
+    data = request.json or {}
+    requested = {kind: list(dict.fromkeys(data.get(kind + 's') or [])) for kind in TRACKED_KINDS}
+    
+    if not any(requested.values()):
+        return jsonify({'error': 'Provide videos and/or channels to track'}), 400
+    if sum(len(item_ids) for item_ids in requested.values()) > MAX_TRACK_PER_REQUEST:
+        return jsonify({'error': f'At most {MAX_TRACK_PER_REQUEST} items can be tracked per request'}), 400
+    
+    tracked = {(item.kind, item.item_id) for item in TrackedItem.query.filter_by(user_id=current_user.id)}
+    added, not_found = [], []
+    try:
+        for kind, item_ids in requested.items():
+            new_ids = [item_id for item_id in item_ids if (kind, item_id) not in tracked]
+            if not new_ids:
+                continue
+            found = stats_tracker.snapshot(kind, new_ids)
+            for item_id in new_ids:
+                if item_id not in found:
+                    not_found.append({'kind': kind, 'item_id': item_id})
+                    continue
+                item = TrackedItem(user_id=current_user.id, kind=kind, item_id=item_id, created_at=datetime.utcnow())
+                db.session.add(item)
+                added.append(item)
+    except HttpError as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error tracking items: {e}'}), 502
+    db.session.commit()
+    
+    return jsonify({'added': [item.to_dict() for item in added], 'notFound': not_found})
+
+@app.route('/api/tracking', methods=['GET'])
+@login_required
+def get_tracked_items():
+    items = TrackedItem.query.filter_by(user_id=current_user.id).order_by(TrackedItem.created_at).all()
+    return jsonify({'items': [
+        dict(item.to_dict(), latest=stats_tracker.store.latest(item.item_id)) for item in items
+    ]})
+
+def get_tracked_item(kind, item_id):
+    return TrackedItem.query.filter_by(user_id=current_user.id, kind=kind, item_id=item_id).first()
+
+@app.route('/api/tracking/<kind>/<item_id>', methods=['DELETE'])
+@login_required
+def untrack_item(kind, item_id):
+    item = get_tracked_item(kind, item_id)
+    if item is None:
+        return jsonify({'error': 'Item is not tracked'}), 404
+    
+    db.session.delete(item)
+    db.session.commit()
+    
+    return jsonify({'success': True})
+
+@app.route('/api/tracking/<kind>/<item_id>/series', methods=['GET'])
+@login_required
+def get_tracked_series(kind, item_id):
+    """Snapshots between since and until (Unix seconds; default the last 7 days), downsampled to `points`"""
+    if get_tracked_item(kind, item_id) is None:
+        return jsonify({'error': 'Item is not tracked'}), 404
+    
+    until = request.args.get('until', int(time.time()), type=int)
+    since = request.args.get('since', until - 7 * 86400, type=int)
+    points = min(max(request.args.get('points', 200, type=int), 1), 1000)
+    
+    return jsonify({
+        'kind': kind,
+        'item_id': item_id,
+        'since': since,
+        'until': until,
+        'series': stats_tracker.store.series(item_id, since, until, points)
+    })
+
+@app.route('/api/tracking/<kind>/<item_id>/growth', methods=['GET'])
+@login_required
+def get_tracked_growth(kind, item_id):
+    if get_tracked_item(kind, item_id) is None:
+        return jsonify({'error': 'Item is not tracked'}), 404
+    
+    return jsonify({
+        'kind': kind,
+        'item_id': item_id,
+        'latest': stats_tracker.store.latest(item_id),
+        'growth': growth_rates(stats_tracker.store, item_id)
+    })
+
 # Analysis management routes
+def encode_cursor(analysis):
+    raw = f"{analysis.created_at.isoformat()}|{analysis.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    created_at, analysis_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+    return datetime.fromisoformat(created_at), int(analysis_id)
+
 @app.route('/api/analyses', methods=['GET'])
 @login_required
 def get_analyses():
-    analyses = Analysis.query.filter_by(user_id=current_user.id).order_by(Analysis.created_at.desc()).all()
-    return jsonify({'analyses': [analysis.to_dict() for analysis in analyses]})
+    # Keyset pagination: newest first, continuing after the (created_at, id) in the cursor
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    cursor = request.args.get('cursor')
+    
+    # Field projection; view=summary drops the large content column for list views
+    fields = request.args.get('fields')
+    if fields:
+        fields = [field for field in fields.split(',') if field in Analysis.FIELDS]
+    elif request.args.get('view') == 'summary':
+        fields = [field for field in Analysis.FIELDS if field != 'content']
+    else:
+        fields = None
+    
+    query = Analysis.query.filter_by(user_id=current_user.id)
+    
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(or_(
+            Analysis.created_at < cursor_created_at,
+            and_(Analysis.created_at == cursor_created_at, Analysis.id < cursor_id)
+        ))
+    
+    if fields is not None and 'content' not in fields:
+        query = query.options(defer(Analysis.content))
+    
+    analyses = query.order_by(Analysis.created_at.desc(), Analysis.id.desc()).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(analyses) > limit:
+        analyses = analyses[:limit]
+        next_cursor = encode_cursor(analyses[-1])
+    
+    return jsonify({
+        'analyses': [analysis.to_dict(fields) for analysis in analyses],
+        'nextCursor': next_cursor
+    })
+
+@app.route('/api/analyses/search', methods=['GET'])
+@login_required
+def search_saved_analyses():
+    query = request.args.get('q', '').strip()
+    
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+    
+    if not search_index_enabled:
+        return jsonify({'error': 'Search requires the SQLite database'}), 501
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    results = search_analyses(
+        current_user.id,
+        query,
+        analysis_type=request.args.get('type'),
+        video_id=request.args.get('video_id'),
+        limit=limit
+    )
+    
+    return jsonify({'analyses': results})
 
 @app.route('/api/analyses', methods=['POST'])
 @login_required
@@ -325,7 +1049,74 @@ def save_analysis():
     
     return jsonify({'message': 'Analysis saved successfully', 'analysis': analysis.to_dict()})
 
+@app.route('/api/analyses/export', methods=['GET'])
+@login_required
+def export_analyses():
+    query = Analysis.query.filter_by(user_id=current_user.id)
+    
+    if request.args.get('type'):
+        query = query.filter_by(type=request.args.get('type'))
+    if request.args.get('video_id'):
+        query = query.filter_by(video_id=request.args.get('video_id'))
+    
+    def generate():
+        # yield_per streams rows from the cursor in batches instead of loading them all
+        for analysis in query.order_by(Analysis.id).yield_per(1000):
+            yield json.dumps(analysis.to_dict()) + "\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=analyses.ndjson'}
+    )
 
+IMPORT_BATCH_SIZE = 1000
+
+@app.route('/api/analyses/import', methods=['POST'])
+@login_required
+def import_analyses():
+    """Import NDJSON analyses (as produced by the export) in batched transactions"""
+    imported = 0
+    errors = []
+    batch = []
+    
+    def flush():
+        db.session.execute(insert(Analysis), batch)
+        db.session.commit()
+        batch.clear()
+    
+    for line_number, line in enumerate(request.stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict) or not all(record.get(key) for key in ['type', 'video_id', 'instruction', 'content']):
+                raise ValueError('Missing required fields')
+            created_at = record.get('created_at')
+            batch.append({
+                'user_id': current_user.id,
+                'type': record['type'],
+                'video_id': record['video_id'],
+                'instruction': record['instruction'],
+                'content': record['content'],
+                'created_at': datetime.fromisoformat(created_at) if created_at else datetime.utcnow()
+            })
+        except (TypeError, ValueError) as e:
+            if len(errors) < 100:
+                errors.append({'line': line_number, 'error': str(e)})
+            continue
+        
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported += len(batch)
+            flush()
+    
+    if batch:
+        imported += len(batch)
+        flush()
+    
+    return jsonify({'imported': imported, 'errors': errors})
 
 @app.route('/api/analyses/<int:analysis_id>', methods=['DELETE'])
 @login_required
@@ -366,7 +1157,44 @@ def get_dashboard_stats():
         'channelsAnalyzed': channels_analyzed_count
     })
 
+@app.route('/api/quota', methods=['GET'])
+@login_required
+def get_quota():
+    # Units the response cache kept from reaching the API in this process
+    cache_stats = youtube_client.cache.stats()
+    saved = sum(
+        counts['hits'] * QUOTA_COSTS.get(resource, 1)
+        for resource, counts in cache_stats['by_resource'].items()
+    )
+    
+    return jsonify({'quota': youtube_client.scheduler.status(), 'savedByCache': saved})
+
+@app.route('/api/cache/stats', methods=['GET'])
+@login_required
+def get_cache_stats():
+    return jsonify({
+        'youtube': youtube_client.cache.stats(),
+        'analysis': claude_client.result_cache.stats(),
+        'prompt': claude_client.usage_stats()
+    })
+
+def collect_cache_metrics():
+    # Lookups are counted where they happen; only the ratios are refreshed here
+    CACHE_HIT_RATIO.set(youtube_client.cache.stats()['hit_rate'], cache='youtube')
+    CACHE_HIT_RATIO.set(claude_client.result_cache.stats()['hit_rate'], cache='analysis')
+
+    CACHE_HIT_RATIO.set(claude_client.usage_stats()['totals']['cache_read_rate'], cache='prompt')
+
+REGISTRY.add_collector(collect_cache_metrics)
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text exposition format; left unauthenticated for scrapers
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
+    # The reloader's child process is the one serving; it owns every running job
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_manager.fail_interrupted()
+        start_background_work()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,385 @@
+import asyncio
+import contextvars
+import itertools
+import os
+import threading
+import time
+import httpx
+import httplib2
+from googleapiclient.errors import HttpError
+from dotenv import load_dotenv
+from cache import ResponseCache
+from metrics import log_error, upstream_timer
+from quota import QuotaScheduler
+from youtube_client import (
+    YouTubeClient, API_ENDPOINT, CHANNEL_REFRESH_SECONDS, COMMENT_PAGE_SIZE, VIDEO_BATCH_SIZE
+)
+from youtube_store import ChannelIndex, ChannelVideoStore
+
+# Load environment variables
+load_dotenv()
+
+
+async def in_context(context, coro):
+    """Await coro with the variables of a context copied from another thread, such
+    as the quota feature and trace ID; tasks on a loop thread do not see them"""
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+class AsyncYouTubeClient:
+    """
+    asyncio counterpart of YouTubeClient with the same Data API methods as
+    coroutines. Requests share one pooled HTTP session, so independent calls can
+    run concurrently. Pass the sync client's cache, channel index, scheduler and
+    video store to share them; their SQLite calls run in worker threads, off the
+    event loop. Transcripts do not come from the Data API and stay on
+    YouTubeClient.
+    """
+
+    def __init__(self, cache=None, channel_index=None, scheduler=None, video_store=None, max_connections=20):
+        # Get API key from environment variables
+        self.api_key = os.environ.get('YOUTUBE_API_KEY')
+        if not self.api_key:
+            raise ValueError("YouTube API key not found. Set YOUTUBE_API_KEY in .env file.")
+
+        self.max_results = 10
+        self.max_connections = max_connections
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.channel_index = channel_index if channel_index is not None else ChannelIndex()
+        self.scheduler = scheduler if scheduler is not None else QuotaScheduler.from_env()
+        self.video_store = video_store if video_store is not None else ChannelVideoStore()
+        self._session = None
+
+    def _get_session(self):
+        # Created lazily so the session belongs to the event loop that uses it
+        if self._session is None:
+            self._session = httpx.AsyncClient(
+                base_url=API_ENDPOINT.rstrip('/') + '/youtube/v3/',
+                timeout=30,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._session
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.aclose()
+            self._session = None
+
+    async def _request(self, resource, params):
+        with upstream_timer('youtube', resource):
+            response = await self._get_session().get(resource, params=dict(params, key=self.api_key))
+            if response.status_code >= 400:
+                # Raise the same error type as googleapiclient so callers handle both clients alike
+                raise HttpError(httplib2.Response({'status': response.status_code}), response.content)
+            return response.json()
+
+    async def _list(self, resource, use_cache=True, **params):
+        """Run a Data API list call through the response cache and quota scheduler"""
+        if use_cache:
+            cached = await asyncio.to_thread(self.cache.get, resource, params)
+            if cached is not None:
+                return cached
+
+        # Connection errors and timeouts are retried like server errors
+        response = await self.scheduler.execute_async(
+            resource, lambda: self._request(resource, params), transient=(httpx.TransportError,)
+        )
+        if use_cache:
+            await asyncio.to_thread(self.cache.set, resource, params, response)
+        return response
+
+    async def search_videos(self, query, max_results=None, order=None, video_duration=None, published_after=None, published_before=None, enrich=False):
+        """Search for videos matching the query with advanced filters"""
+        if max_results is None:
+            max_results = self.max_results
+
+        search_params = YouTubeClient._video_search_params(
+            query, max_results, order, video_duration, published_after, published_before
+        )
+        search_response = await self._list('search', **search_params)
+        videos = [YouTubeClient._parse_search_video(item) for item in search_response.get('items', [])]
+
+        if enrich:
+            videos = await self._enrich_videos(videos)
+
+        return videos
+
+    async def get_video_details(self, video_id):
+        """Get detailed information about a specific video"""
+        details = await self.get_videos_details([video_id])
+        return details[0] if details else None
+
+    async def get_videos_details(self, video_ids):
+        """Get detailed information for many videos; the 50-ID chunks are fetched concurrently"""
+        unique_ids = list(dict.fromkeys(video_ids))
+        chunks = [unique_ids[i:i + VIDEO_BATCH_SIZE] for i in range(0, len(unique_ids), VIDEO_BATCH_SIZE)]
+        results = await asyncio.gather(*(self._get_videos_chunk(chunk) for chunk in chunks))
+
+        details_by_id = {}
+        for chunk_details in results:
+            details_by_id.update(chunk_details)
+
+        return [details_by_id[video_id] for video_id in video_ids if video_id in details_by_id]
+
+    async def _get_videos_chunk(self, video_ids):
+        video_response = await self._list(
+            'videos',
+            part='snippet,contentDetails,statistics',
+            id=','.join(video_ids)
+        )
+        return {item['id']: YouTubeClient._parse_video_item(item) for item in video_response.get('items', [])}
+
+    async def _enrich_videos(self, videos):
+        """Merge statistics and content details into snippet-only video results"""
+        details = await self.get_videos_details([video['id'] for video in videos])
+        details_by_id = {video['id']: video for video in details}
+        return [dict(video, **details_by_id.get(video['id'], {})) for video in videos]
+
+    async def get_video_comments(self, video_id, max_results=None, page_token=None):
+        """Get comments for a specific video with pagination support"""
+        if max_results is None:
+            max_results = self.max_results
+
+        params = {
+            'part': 'snippet',
+            'videoId': video_id,
+            'maxResults': max_results,
+            'textFormat': 'plainText'
+        }
+        if page_token:
+            params['pageToken'] = page_token
+
+        comments_response = await self._list('commentThreads', **params)
+        comments = [
+            YouTubeClient._parse_comment(item['id'], item['snippet']['topLevelComment']['snippet'])
+            for item in comments_response.get('items', [])
+        ]
+        return comments, comments_response.get('nextPageToken')
+
+    async def iter_video_comments(self, video_id, max_comments=None, time_budget=None, include_replies=False, order=None):
+        """Async generator over a video's comments, following nextPageToken (see YouTubeClient.iter_video_comments)"""
+        deadline = time.monotonic() + time_budget if time_budget else None
+        remaining = max_comments
+        page_token = None
+
+        while True:
+            params = {
+                'part': 'snippet,replies' if include_replies else 'snippet',
+                'videoId': video_id,
+                'maxResults': COMMENT_PAGE_SIZE,
+                'textFormat': 'plainText'
+            }
+            if order:
+                params['order'] = order
+            if page_token:
+                params['pageToken'] = page_token
+
+            try:
+                comments_response = await self._list('commentThreads', **params)
+            except HttpError as e:
+                if not page_token:
+                    raise
+                # Keep the comments harvested so far
+                log_error('youtube_error', e, resource='commentThreads', status=e.resp.status)
+                return
+
+            for item in comments_response.get('items', []):
+                page = [YouTubeClient._parse_comment(item['id'], item['snippet']['topLevelComment']['snippet'])]
+                if include_replies:
+                    page = itertools.chain(page, await self._get_comment_replies(item, deadline))
+
+                for comment in page:
+                    yield comment
+                    if remaining is not None:
+                        remaining -= 1
+                        if remaining <= 0:
+                            return
+
+            page_token = comments_response.get('nextPageToken')
+            if not page_token or (deadline and time.monotonic() >= deadline):
+                return
+
+    async def _get_comment_replies(self, thread, deadline=None):
+        """The replies of a comment thread (see YouTubeClient._iter_comment_replies)"""
+        inline_replies = thread.get('replies', {}).get('comments', [])
+        total_replies = thread['snippet'].get('totalReplyCount', 0)
+        if len(inline_replies) >= total_replies:
+            replies = inline_replies
+        else:
+            replies = []
+            page_token = None
+            while True:
+                params = {
+                    'part': 'snippet',
+                    'parentId': thread['id'],
+                    'maxResults': COMMENT_PAGE_SIZE,
+                    'textFormat': 'plainText'
+                }
+                if page_token:
+                    params['pageToken'] = page_token
+
+                try:
+                    replies_response = await self._list('comments', **params)
+                except HttpError as e:
+                    log_error('youtube_error', e, resource='comments', status=e.resp.status)
+                    break
+
+                replies.extend(replies_response.get('items', []))
+                page_token = replies_response.get('nextPageToken')
+                if not page_token or (deadline and time.monotonic() >= deadline):
+                    break
+
+        comments = []
+        for reply in replies:
+            comment = YouTubeClient._parse_comment(reply['id'], reply['snippet'])
+            comment['parent_id'] = thread['id']
+            comments.append(comment)
+        return comments
+
+    async def get_comments_for_videos(self, video_ids, max_comments=100, time_budget=None, include_replies=False):
+        """Harvest comments for several videos concurrently; returns {video_id: comments}"""
+        async def collect(video_id):
+            comments = self.iter_video_comments(
+                video_id, max_comments=max_comments, time_budget=time_budget, include_replies=include_replies
+            )
+            return [comment async for comment in comments]
+
+        results = await asyncio.gather(*(collect(video_id) for video_id in video_ids))
+        return dict(zip(video_ids, results))
+
+    async def get_channel_details(self, channel_id):
+        """Get detailed information about a specific channel"""
+        channel_response = await self._list(
+            'channels',
+            part='snippet,statistics,contentDetails',
+            id=channel_id
+        )
+        if not channel_response.get('items'):
+            return None
+
+        channel_details = YouTubeClient._parse_channel_item(channel_response['items'][0])
+        await asyncio.to_thread(self.channel_index.set, channel_details['id'], channel_details['playlist_id'])
+        return channel_details
+
+    async def get_uploads_playlist_id(self, channel_id):
+        """Get the uploads playlist of a channel, calling channels.list only for unseen channels"""
+        playlist_id = await asyncio.to_thread(self.channel_index.get, channel_id)
+        if playlist_id:
+            return playlist_id
+
+        channel = await self.get_channel_details(channel_id)
+        return channel['playlist_id'] if channel else None
+
+    async def crawl_channel_uploads(self, channel_id, playlist_id=None, max_pages=None, resume=True):
+        """Walk a channel's uploads playlist into the local video store (see YouTubeClient.crawl_channel_uploads)"""
+        crawl = await asyncio.to_thread(self.video_store.get_crawl, channel_id)
+        if playlist_id is None:
+            playlist_id = crawl['playlist_id'] if crawl else await self.get_uploads_playlist_id(channel_id)
+            if not playlist_id:
+                return None
+
+        # The page loop is the sync store's; each page's request runs back on this loop
+        loop = asyncio.get_running_loop()
+
+        async def fetch(page_token):
+            response = await self._list(
+                'playlistItems', use_cache=False, **YouTubeClient._uploads_page_params(playlist_id, page_token)
+            )
+            videos = [YouTubeClient._parse_playlist_video(item) for item in response.get('items', [])]
+            return videos, response.get('nextPageToken')
+
+        def fetch_page(page_token):
+            coro = in_context(contextvars.copy_context(), fetch(page_token))
+            return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+        return await asyncio.to_thread(
+            self.video_store.crawl, channel_id, playlist_id, fetch_page, max_pages=max_pages, resume=resume
+        )
+
+    async def get_channel_videos(self, channel_id, max_results=10, enrich=False, playlist_id=None, offset=0):
+        """Get a channel's videos, newest first, from the local video store (see YouTubeClient.get_channel_videos)"""
+        try:
+            crawl = await asyncio.to_thread(self.video_store.get_crawl, channel_id)
+            if crawl is None or time.time() - crawl['crawled_at'] > CHANNEL_REFRESH_SECONDS:
+                await self.crawl_channel_uploads(
+                    channel_id, playlist_id=playlist_id, max_pages=None if crawl else 1, resume=False
+                )
+
+        except HttpError as e:
+            # Serve whatever is already stored
+            log_error('youtube_error', e, resource='playlistItems', status=e.resp.status)
+
+        videos = await asyncio.to_thread(self.video_store.list_videos, channel_id, limit=max_results, offset=offset)
+
+        if enrich and videos:
+            videos = await self._enrich_videos(videos)
+
+        return videos
+
+    async def get_channel_bundle(self, channel_id, max_results=10, enrich=False):
+        """
+        Get a channel's details and its recent videos together. When the uploads
+        playlist is already indexed, both requests run concurrently.
+        Returns (channel, videos); channel is None if it does not exist.
+        """
+        playlist_id = await asyncio.to_thread(self.channel_index.get, channel_id)
+        if playlist_id is None:
+            channel = await self.get_channel_details(channel_id)
+            if not channel:
+                return None, []
+            videos = await self.get_channel_videos(
+                channel_id, max_results=max_results, enrich=enrich, playlist_id=channel['playlist_id']
+            )
+            return channel, videos
+
+        return tuple(await asyncio.gather(
+            self.get_channel_details(channel_id),
+            self.get_channel_videos(channel_id, max_results=max_results, enrich=enrich, playlist_id=playlist_id)
+        ))
+
+    async def search_channels(self, query, max_results=5):
+        """Search for channels matching the query"""
+        search_response = await self._list(
+            'search',
+            q=query,
+            part='snippet',
+            maxResults=max_results,
+            type='channel'
+        )
+        return [YouTubeClient._parse_search_channel(item) for item in search_response.get('items', [])]
+
+
+class SyncYouTubeFacade:
+    """
+    Runs an AsyncYouTubeClient on a background event loop so synchronous code,
+    such as the Flask routes, can call its coroutines as plain methods.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='youtube-async', daemon=True)
+        self._thread.start()
+
+    def run(self, coro):
+        """Run a coroutine on the client's loop and wait for its result"""
+        context = contextvars.copy_context()
+        future = asyncio.run_coroutine_threadsafe(in_context(context, coro), self._loop)
+        return future.result()
+
+    def gather(self, *coros):
+        """Run several coroutines concurrently and return their results in order"""
+        async def gather_all():
+            return await asyncio.gather(*coros)
+        return self.run(gather_all())
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if asyncio.iscoroutinefunction(attr):
+            return lambda *args, **kwargs: self.run(attr(*args, **kwargs))
+        return attr
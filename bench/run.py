@@ -0,0 +1,250 @@
+"""
+Benchmark the Flask endpoints offline.
+
+Starts the stand-in YouTube and Anthropic servers from bench/stub_server.py,
+points the app at them, serves the app on a local port and drives each
+scenario at the requested concurrency, reporting latency percentiles and
+throughput. Run from the repository root:
+
+    python -m bench.run --requests 200 --concurrency 16 --youtube-latency 80 --claude-latency 1500
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import httpx
+
+from bench.stub_server import StubState, load_fixture, start_stub_server, video_id
+
+SCENARIOS = ('search', 'video', 'comments', 'transcript', 'stream', 'channel', 'analyses')
+# Scenarios whose requests reach the Claude stand-in
+CLAUDE_SCENARIOS = {'transcript', 'stream', 'channel'}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=100, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests before each scenario')
+    parser.add_argument('--distinct', type=int, default=20,
+                        help='distinct queries/videos/instructions to rotate through; lower means more cache hits')
+    parser.add_argument('--youtube-latency', type=float, default=50, help='injected YouTube latency (ms)')
+    parser.add_argument('--claude-latency', type=float, default=500, help='injected Claude latency (ms)')
+    parser.add_argument('--jitter', type=float, default=0.2, help='latency jitter as a fraction (0.2 = +/-20%%)')
+    parser.add_argument('--pages', type=int, default=5, help='pages served for paginated YouTube lists')
+    parser.add_argument('--transcript-minutes', type=int, default=20, help='length of the seeded transcripts')
+    parser.add_argument('--seed-analyses', type=int, default=2000, help='saved analyses to import first')
+    parser.add_argument('--no-youtube-cache', action='store_true', help='disable the YouTube response cache')
+    parser.add_argument('--json', dest='json_path', help='also write the results to this JSON file')
+    return parser.parse_args(argv)
+
+
+def configure_environment(args, stub_url, workdir):
+    """Point every client at the stand-ins and keep all state inside workdir"""
+    os.environ.update({
+        'YOUTUBE_API_KEY': 'bench',
+        'ANTHROPIC_API_KEY': 'bench',
+        'YOUTUBE_API_ENDPOINT': stub_url + '/',
+        'ANTHROPIC_BASE_URL': stub_url,
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'app.db'),
+        'YOUTUBE_STORE_PATH': os.path.join(workdir, 'youtube_store.db'),
+        'YOUTUBE_CACHE_BACKEND': 'memory',
+        'YOUTUBE_CACHE_MAX_MB': '0' if args.no_youtube_cache else '64',
+        # The stand-ins have no quota, so keep the scheduler from throttling the run
+        'YOUTUBE_DAILY_QUOTA': str(10 ** 9),
+        'YOUTUBE_RATE_LIMIT': '100000',
+        'YOUTUBE_RATE_BURST': '100000',
+    })
+
+
+def seed_transcripts(store, count, minutes):
+    """Store transcripts so analyses never try to download them from YouTube"""
+    recorded = load_fixture('transcript.json')
+    span = recorded[-1]['start'] + recorded[-1]['duration']
+    segments = []
+    offset = 0.0
+    while offset < minutes * 60:
+        segments.extend(dict(segment, start=segment['start'] + offset) for segment in recorded)
+        offset += span
+    for n in range(count):
+        store.put(video_id(n), 'en', segments)
+
+
+def seed_analyses(session, count):
+    now = datetime.utcnow()
+    lines = (
+        json.dumps({
+            'type': 'video',
+            'video_id': video_id(n % 50),
+            'instruction': f'Benchmark instruction {n}',
+            'content': 'Seeded analysis content for benchmarking. ' * 10,
+            'created_at': (now - timedelta(minutes=n)).isoformat()
+        })
+        for n in range(count)
+    )
+    response = session.post('/api/analyses/import', content="\n".join(lines).encode('utf-8'))
+    response.raise_for_status()
+
+
+def scenario_request(name, i, distinct):
+    """(method, path, JSON body) of the i-th request of a scenario"""
+    n = i % distinct
+    if name == 'search':
+        return 'POST', '/api/search', {'query': f'python asyncio {n}', 'maxResults': 10, 'enrich': True}
+    if name == 'video':
+        return 'GET', f'/api/video/{video_id(n)}', None
+    if name == 'comments':
+        return 'GET', f'/api/video/{video_id(n)}/comments', None
+    if name == 'transcript':
+        return 'POST', '/api/analyze/transcript', {'video_id': video_id(n), 'instruction': f'Summarize the key points ({n})'}
+    if name == 'stream':
+        return 'POST', '/api/analyze/transcript/stream', {'video_id': video_id(n), 'instruction': f'List the topics ({n})'}
+    if name == 'channel':
+        return 'POST', '/api/analyze/channel', {
+            'channel_id': f'UCbench{n:017d}', 'instruction': f'Assess the content strategy ({n})'
+        }
+    if name == 'analyses':
+        return 'GET', '/api/analyses?limit=20&view=summary', None
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def failed(response):
+    """Whether a response is an error, including analyses that failed inside a 200"""
+    if response.status_code >= 400:
+        return True
+    if response.headers.get('content-type', '').startswith('text/event-stream'):
+        # A stream that broke off or reported an error never sends 'done'
+        return 'event: done' not in response.text or 'event: error' in response.text
+    if response.headers.get('content-type', '').startswith('application/json'):
+        analysis = response.json().get('analysis')
+        return isinstance(analysis, str) and analysis.startswith('Error analyzing')
+    return False
+
+
+def run_scenario(name, args, base_url, cookies):
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, 'client'):
+            local.client = httpx.Client(base_url=base_url, cookies=cookies, timeout=300)
+        return local.client
+
+    def send(i):
+        method, path, body = scenario_request(name, i, args.distinct)
+        start = time.perf_counter()
+        response = session().request(method, path, json=body)
+        return time.perf_counter() - start, failed(response)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(send, range(args.warmup)))
+
+        start = time.perf_counter()
+        results = list(executor.map(send, range(args.warmup, args.warmup + args.requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    return {
+        'scenario': name,
+        'requests': len(results),
+        'errors': sum(1 for _, error in results if error),
+        'rps': len(results) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': latencies[-1] if latencies else 0.0
+    }
+
+
+def print_report(results, args):
+    print(f"\nconcurrency={args.concurrency} requests={args.requests} distinct={args.distinct} "
+          f"youtube_latency={args.youtube_latency}ms claude_latency={args.claude_latency}ms")
+    header = f"{'scenario':<12}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['scenario']:<12}{r['requests']:>9}{r['errors']:>8}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    state = StubState(
+        youtube_latency=args.youtube_latency / 1000,
+        claude_latency=args.claude_latency / 1000,
+        jitter=args.jitter,
+        pages=args.pages
+    )
+    stub = start_stub_server(state)
+    stub_url = 'http://%s:%d' % stub.server_address
+
+    workdir = tempfile.mkdtemp(prefix='yt-analyzer-bench-')
+    configure_environment(args, stub_url, workdir)
+
+    # Imported only now so the clients pick up the stand-in endpoints
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import app as app_module
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    seed_transcripts(app_module.youtube_client.transcript_store, args.distinct, args.transcript_minutes)
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    base_url = 'http://127.0.0.1:%d' % server.server_port
+
+    with httpx.Client(base_url=base_url) as session:
+        session.post('/register', data={'username': 'bench', 'email': 'bench@example.com', 'password': 'bench'})
+        session.post('/login', data={'username': 'bench', 'password': 'bench'})
+        if 'analyses' in scenarios and args.seed_analyses:
+            seed_analyses(session, args.seed_analyses)
+        cookies = dict(session.cookies)
+
+    results = []
+    # The app writes a log line per request; keep them out of the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name in scenarios:
+            print(f"Running {name}...", file=sys.stderr)
+            results.append(run_scenario(name, args, base_url, cookies))
+
+    print_report(results, args)
+    print(f"claude calls: {state.claude_calls}")
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': results, 'claude_calls': state.claude_calls}, f, indent=2)
+
+    server.shutdown()
+    stub.shutdown()
+
+    # Numbers from a run whose requests failed, or that never reached Claude, are not comparable
+    problems = [f"{r['scenario']}: {r['errors']} failed requests" for r in results if r['errors']]
+    if CLAUDE_SCENARIOS.intersection(scenarios) and not state.claude_calls:
+        problems.append("no request reached the Claude stand-in")
+    if problems:
+        sys.exit("Benchmark failed: " + "; ".join(problems))
+
+
+if __name__ == '__main__':
+    main()
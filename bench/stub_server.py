@@ -0,0 +1,192 @@
+"""
+Local stand-ins for the YouTube Data API and the Anthropic Messages API.
+
+Responses are built from the recorded fixtures in bench/fixtures, expanded to
+the IDs and page sizes each request asks for, and delayed by a configurable
+latency so benchmarks see realistic upstream timing without network access.
+"""
+import copy
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def video_id(n):
+    """An 11-character, YouTube-shaped video ID for the n-th generated video"""
+    return f"bench{n:06d}"
+
+
+class StubState:
+    def __init__(self, youtube_latency=0.05, claude_latency=0.5, jitter=0.2, pages=5):
+        self.youtube = load_fixture('youtube.json')
+        self.claude = load_fixture('claude.json')
+        self.youtube_latency = youtube_latency
+        self.claude_latency = claude_latency
+        self.jitter = jitter
+        self.pages = pages
+        # Messages API calls served, so a run can tell whether Claude was reached
+        self.claude_calls = 0
+        self._lock = threading.Lock()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _items(self, resource, count, make):
+        template = self.youtube[resource]['items']
+        return [make(copy.deepcopy(template[i % len(template)]), i) for i in range(count)]
+
+    def _page(self, resource, params, count, make):
+        page = int(params.get('pageToken') or 0)
+        response = copy.deepcopy({k: v for k, v in self.youtube[resource].items() if k != 'items'})
+        response.pop('nextPageToken', None)
+        response['items'] = self._items(resource, count, lambda item, i: make(item, page * count + i))
+        if page + 1 < self.pages:
+            response['nextPageToken'] = str(page + 1)
+        return response
+
+    def youtube_response(self, resource, params):
+        max_results = int(params.get('maxResults') or 5)
+
+        if resource == 'search':
+            if params.get('type') == 'channel':
+                return copy.deepcopy(self.youtube['channelSearch'])
+
+            def make(item, i):
+                item['id']['videoId'] = video_id(i)
+                return item
+            response = copy.deepcopy(self.youtube['search'])
+            response['items'] = self._items('search', max_results, make)
+            return response
+
+        if resource == 'videos':
+            ids = params['id'].split(',')
+
+            def make(item, i):
+                item['id'] = ids[i]
+                return item
+            response = copy.deepcopy(self.youtube['videos'])
+            response['items'] = self._items('videos', len(ids), make)
+            return response
+
+        if resource == 'channels':
+            ids = params['id'].split(',')
+
+            def make(item, i):
+                item['id'] = ids[i]
+                item['contentDetails']['relatedPlaylists']['uploads'] = 'UU' + ids[i][2:]
+                return item
+            response = copy.deepcopy(self.youtube['channels'])
+            response['items'] = self._items('channels', len(ids), make)
+            return response
+
+        if resource == 'playlistItems':
+            def make(item, i):
+                item['contentDetails']['videoId'] = video_id(i)
+                item['snippet']['resourceId']['videoId'] = video_id(i)
+                return item
+            return self._page('playlistItems', params, max_results, make)
+
+        if resource == 'commentThreads':
+            def make(item, i):
+                item['id'] = f"Ug{params.get('videoId', '')}{i:06d}"
+                return item
+            return self._page('commentThreads', params, max_results, make)
+
+        return None
+
+    def claude_message(self, request):
+        with self._lock:
+            self.claude_calls += 1
+        message = copy.deepcopy(self.claude)
+        message['model'] = request.get('model', message['model'])
+        # Rough prompt size, so token metrics move with the prompts the app sends
+        content = request['messages'][0]['content']
+        text = content if isinstance(content, str) else "".join(block['text'] for block in content)
+        message['usage']['input_tokens'] = len(text) // 4 + 1
+        return message
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        prefix = '/youtube/v3/'
+        if not url.path.startswith(prefix):
+            return self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.state.sleep(self.state.youtube_latency)
+        response = self.state.youtube_response(url.path[len(prefix):], params)
+        if response is None:
+            return self._send_json(404, {'error': {'code': 404, 'message': 'Unknown resource'}})
+        self._send_json(200, response)
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/v1/messages':
+            return self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error'}})
+
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        message = self.state.claude_message(request)
+        if not request.get('stream'):
+            self.state.sleep(self.state.claude_latency)
+            return self._send_json(200, message)
+
+        # Stream the fixture text in small deltas over the configured latency
+        text = message['content'][0]['text']
+        deltas = [text[i:i + 40] for i in range(0, len(text), 40)]
+        start = dict(message, content=[], stop_reason=None)
+        start['usage'] = dict(message['usage'], output_tokens=1)
+        events = [('message_start', {'type': 'message_start', 'message': start}),
+                  ('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                           'content_block': {'type': 'text', 'text': ''}})]
+        events += [('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                            'delta': {'type': 'text_delta', 'text': delta}}) for delta in deltas]
+        events += [('content_block_stop', {'type': 'content_block_stop', 'index': 0}),
+                   ('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                                      'usage': {'output_tokens': message['usage']['output_tokens']}}),
+                   ('message_stop', {'type': 'message_stop'})]
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        pause = self.state.claude_latency / len(events)
+        for name, data in events:
+            self.state.sleep(pause)
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+
+def start_stub_server(state, host='127.0.0.1', port=0):
+    """Serve state on a background thread; returns the server (see server.server_address)"""
+    handler = type('BoundStubHandler', (StubHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='bench-stub', daemon=True).start()
+    return server
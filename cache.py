@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from metrics import CACHE_LOOKUPS
+
+# Seconds each kind of YouTube response stays fresh. Statistics move quickly,
+# channel metadata and upload listings much less so.
+DEFAULT_TTLS = {
+    'search': 600,
+    'videos': 300,
+    'channels': 3600,
+    'commentThreads': 300,
+    'comments': 300,
+    'playlistItems': 900,
+}
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class MemoryBackend:
+    """In-process LRU store capped by the total size of the stored values"""
+
+    name = 'memory'
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.time() + ttl, value)
+            self._size += size
+
+            # Drop least recently used entries until we are back under the cap
+            while self._size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def info(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions
+            }
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._size -= len(value)
+
+
+class SQLiteBackend:
+    """LRU store in a SQLite file, shared by every worker process on the host"""
+
+    name = 'sqlite'
+
+    def __init__(self, path='youtube_cache.db', max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS response_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' expires_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL)'
+        )
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS ix_response_cache_accessed '
+            'ON response_cache (accessed_at)'
+        )
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            'SELECT value, expires_at FROM response_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at = row
+        if expires_at < now:
+            conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+            conn.commit()
+            return None
+
+        conn.execute('UPDATE response_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        conn.commit()
+        return bytes(value)
+
+    def set(self, key, value, ttl):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO response_cache (key, value, size, expires_at, accessed_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (key, value, size, now + ttl, now)
+        )
+
+        # Expired rows go first, then the least recently used ones
+        conn.execute('DELETE FROM response_cache WHERE expires_at < ?', (now,))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM response_cache').fetchone()[0]
+        while total > self.max_bytes:
+            row = conn.execute(
+                'SELECT key, size FROM response_cache ORDER BY accessed_at LIMIT 1'
+            ).fetchone()
+            if row is None:
+                break
+            conn.execute('DELETE FROM response_cache WHERE key = ?', (row[0],))
+            total -= row[1]
+            self.evictions += 1
+
+        conn.commit()
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM response_cache')
+        conn.commit()
+
+    def info(self):
+        conn = self._connection()
+        entries, size = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache'
+        ).fetchone()
+        return {
+            'backend': self.name,
+            'path': self.path,
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions
+        }
+
+
+class ResponseCache:
+    """Caches YouTube Data API responses keyed on the normalized request parameters"""
+
+    def __init__(self, backend=None, ttls=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+        self._counters = {}  # resource -> [hits, misses]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from the YOUTUBE_CACHE_* environment variables"""
+        max_bytes = int(os.environ.get('YOUTUBE_CACHE_MAX_MB', 64)) * 1024 * 1024
+        backend_name = os.environ.get('YOUTUBE_CACHE_BACKEND', 'memory')
+
+        if backend_name == 'sqlite':
+            path = os.environ.get('YOUTUBE_CACHE_PATH', 'youtube_cache.db')
+            backend = SQLiteBackend(path, max_bytes=max_bytes)
+        elif backend_name == 'memory':
+            backend = MemoryBackend(max_bytes=max_bytes)
+        else:
+            raise ValueError(f"Unknown YOUTUBE_CACHE_BACKEND: {backend_name}")
+
+        return cls(backend)
+
+    @staticmethod
+    def normalize_params(params):
+        """Drop empty values and canonicalize strings so equivalent requests share a key"""
+        normalized = {}
+        for key, value in params.items():
+            if value is None or value == '':
+                continue
+            if isinstance(value, str):
+                value = ' '.join(value.split())
+                if key == 'q':
+                    value = value.lower()
+                elif value.isdigit():
+                    value = int(value)
+            normalized[key] = value
+        return normalized
+
+    def make_key(self, resource, params):
+        payload = json.dumps(self.normalize_params(params), sort_keys=True, separators=(',', ':'))
+        digest = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+        return f"yt:{resource}:{digest}"
+
+    def get(self, resource, params):
+        value = self.backend.get(self.make_key(resource, params))
+        self._count(resource, hit=value is not None)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, resource, params, response):
+        ttl = self.ttls.get(resource)
+        if not ttl:
+            return
+        value = json.dumps(response, separators=(',', ':')).encode('utf-8')
+        self.backend.set(self.make_key(resource, params), value, ttl)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """Hit and miss counters for this process, overall and per resource"""
+        with self._lock:
+            by_resource = {
+                resource: {'hits': hits, 'misses': misses}
+                for resource, (hits, misses) in self._counters.items()
+            }
+
+        hits = sum(counts['hits'] for counts in by_resource.values())
+        misses = sum(counts['misses'] for counts in by_resource.values())
+        lookups = hits + misses
+
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'by_resource': by_resource,
+            'storage': self.backend.info()
+        }
+
+    def _count(self, resource, hit):
+        with self._lock:
+            counts = self._counters.setdefault(resource, [0, 0])
+            counts[0 if hit else 1] += 1
+        CACHE_LOOKUPS.inc(cache=f"youtube:{resource}", result='hit' if hit else 'miss')
@@ -1,151 +1,605 @@
+import contextvars
+import itertools
 import os
+import queue
+import threading
+import time
+from collections import Counter, deque
 import anthropic
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from engagement import engagement_metrics, summarize
+from metrics import CLAUDE_TOKENS, log_event, upstream_timer
+from prompts import (
+    FIELDS, PROMPT_CACHING_BETA, TEXT_LIMITS, cacheable_message, check_prompt, estimate_tokens,
+    fit_lines, fit_text_limit, format_comment, prompt_budget, serialize
+)
 
 # Load environment variables
 load_dotenv()
 
+# Set while a streamed analysis prepares its prompt; map phases report finished chunks to it
+_progress = contextvars.ContextVar('analysis_progress', default=None)
+
+
+class AnalysisError(Exception):
+    """Raised when Claude could not produce an analysis"""
+
+
 class ClaudeClient:
-    def __init__(self):
+    def __init__(self, result_cache=None):
         # Get API key from environment variables
         self.api_key = os.environ.get('ANTHROPIC_API_KEY')
         if not self.api_key:
             raise ValueError("Anthropic API key not found. Set ANTHROPIC_API_KEY in .env file.")
-        
+
         print("Initializing Claude client...")
         # Initialize client with only the API key
         self.client = anthropic.Anthropic(api_key=self.api_key)
-        
+
         # Use a model that's likely to be available
         self.model = "claude-3-5-sonnet-20240620"
-    
-    def analyze_video_data(self, video_data, instruction):
-        """
-        Analyze video data according to the given instruction
-        """
-        try:
-            # Convert video data to string representation for prompt
-            video_data_str = "Video Information:\n"
-            for key, value in video_data.items():
-                video_data_str += f"{key}: {value}\n"
-            
-            # Create the message to send to Claude
-            message = f"{video_data_str}\n\n{instruction}"
-            
-            # Get response from Claude
+
+        # Output budget of the final response for each kind of analysis
+        self.max_tokens = {
+            'video': 1000,
+            'videos': 1500,
+            'comments': 1500,
+            'channel': 1500,
+            'transcript': 2000
+        }
+
+        # Limits for map-reduce analyses over inputs too large for one prompt
+        self.chunk_tokens = int(os.environ.get('CLAUDE_CHUNK_TOKENS', 20000))
+        self.max_concurrency = int(os.environ.get('CLAUDE_MAX_CONCURRENCY', 4))
+
+        # Input budgets: any single prompt, a multi-video comparison prompt and
+        # the comments kept after preprocessing (see comment_preprocessing)
+        self.prompt_tokens = prompt_budget(max(self.max_tokens.values()))
+        self.compare_tokens = int(os.environ.get('CLAUDE_COMPARE_TOKENS', 12000))
+        self.comment_tokens = int(os.environ.get('CLAUDE_COMMENT_TOKENS', 12000))
+
+        # Optional store of finished analyses (see result_cache.ResultCache)
+        self.result_cache = result_cache
+
+        # Token usage, including prompt cache reads and writes, for every call
+        self.usage = Counter()
+        self.recent_calls = deque(maxlen=100)
+        self._usage_lock = threading.Lock()
+
+    @staticmethod
+    def _usage_counts(usage):
+        """Token counts of an API usage object (or dict); missing counts are 0"""
+        get = usage.get if isinstance(usage, dict) else lambda key: getattr(usage, key, None)
+        return {
+            key: get(key) or 0
+            for key in ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens')
+        }
+
+    def _record_usage(self, counts):
+        call = dict(counts, at=time.time())
+        with self._usage_lock:
+            self.usage['calls'] += 1
+            for key, value in call.items():
+                if key != 'at':
+                    self.usage[key] += value
+            self.recent_calls.append(call)
+
+        CLAUDE_TOKENS.inc(call['input_tokens'], kind='input')
+        CLAUDE_TOKENS.inc(call['output_tokens'], kind='output')
+        CLAUDE_TOKENS.inc(call['cache_read_input_tokens'], kind='cache_read')
+        CLAUDE_TOKENS.inc(call['cache_creation_input_tokens'], kind='cache_creation')
+
+    def usage_stats(self):
+        """Token totals since startup, the share of prompt tokens read from cache and the latest calls"""
+        with self._usage_lock:
+            usage = dict(self.usage)
+            recent = list(self.recent_calls)
+        prompt_tokens = sum(usage.get(key, 0) for key in (
+            'input_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'
+        ))
+        usage['cache_read_rate'] = usage.get('cache_read_input_tokens', 0) / prompt_tokens if prompt_tokens else 0.0
+        return {'totals': usage, 'recent_calls': recent}
+
+    def _complete(self, message, max_tokens):
+        """Send a single-turn prompt to Claude and return the response text"""
+        check_prompt(message, max_tokens)
+        with upstream_timer('claude', 'complete'):
             response = self.client.messages.create(
                 model=self.model,
-                max_tokens=1000,
+                max_tokens=max_tokens,
                 messages=[
                     {"role": "user", "content": message}
-                ]
+                ],
+                extra_headers={"anthropic-beta": PROMPT_CACHING_BETA}
             )
-            
-            # Extract text from the response
-            return response.content[0].text
-            
+        self._record_usage(self._usage_counts(response.usage))
+        return response.content[0].text
+
+    def _stream(self, message, max_tokens):
+        """Send a single-turn prompt to Claude and yield the response text as it arrives"""
+        check_prompt(message, max_tokens)
+        # Prompt and cache token counts arrive in message_start, output tokens in message_delta
+        usage = None
+        try:
+            with upstream_timer('claude', 'stream'):
+                stream = self.client.messages.create(
+                    model=self.model,
+                    max_tokens=max_tokens,
+                    messages=[
+                        {"role": "user", "content": message}
+                    ],
+                    extra_headers={"anthropic-beta": PROMPT_CACHING_BETA},
+                    stream=True
+                )
+                for event in stream:
+                    if event.type == 'message_start':
+                        usage = self._usage_counts(event.message.usage)
+                    elif event.type == 'message_delta' and usage is not None:
+                        usage['output_tokens'] = self._usage_counts(event.usage)['output_tokens']
+                    elif event.type == 'content_block_delta':
+                        yield getattr(event.delta, 'text', '')
+        finally:
+            if usage is not None:
+                self._record_usage(usage)
+
+    def _result_key(self, kind, payload, instruction):
+        if self.result_cache is None:
+            return None
+        return self.result_cache.make_key(kind, payload, instruction, self.model, self.max_tokens[kind])
+
+    def _analyze(self, kind, payload, instruction, prepare, label, key=None):
+        """Return Claude's full response to the prompt built by prepare(), reusing a
+        cached result when the same payload and instruction were analyzed before.
+        Pass key instead of payload when the caller already hashed the inputs.
+        Raises AnalysisError if Claude fails."""
+        try:
+            key = key or self._result_key(kind, payload, instruction)
+            if key:
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    return cached
+
+            text = self._complete(prepare(), self.max_tokens[kind])
+
+            if key:
+                self.result_cache.set(key, kind, self.model, text)
+            return text
         except Exception as e:
-            print(f"Error calling Claude API: {e}")
-            return f"Error analyzing video data: {str(e)}"
-    
-    def analyze_multiple_videos(self, videos_list, instruction):
+            # Counted as an error by whoever handles the AnalysisError
+            log_event('claude_error', label=label, error=str(e), error_type=type(e).__name__)
+            raise AnalysisError(f"Error analyzing {label}: {str(e)}") from e
+
+    @staticmethod
+    def _prepare_with_progress(prepare):
         """
-        Analyze a list of videos according to the given instruction
+        Run prepare() on a helper thread, yielding a {'stage', 'done', 'total'}
+        dict as each map or merge chunk finishes, and return the prompt it built
+        """
+        events = queue.Queue()
+        result = {}
+
+        def run():
+            _progress.set(lambda stage, done, total: events.put({'stage': stage, 'done': done, 'total': total}))
+            try:
+                result['message'] = prepare()
+            except Exception as e:
+                result['error'] = e
+            finally:
+                events.put(None)
+
+        threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+        for event in iter(events.get, None):
+            yield event
+        if 'error' in result:
+            raise result['error']
+        return result['message']
+
+    def _analyze_stream(self, kind, payload, instruction, prepare, label, key=None):
+        """
+        Like _analyze, but yields the response text as it arrives, preceded by a
+        progress dict per finished chunk when a map phase runs first. Raises
+        AnalysisError if Claude fails, including partway through the response.
         """
         try:
-            # Convert video list to string representation for prompt
-            videos_data_str = "Videos Information:\n\n"
-            for i, video in enumerate(videos_list, 1):
-                videos_data_str += f"Video {i}:\n"
-                for key, value in video.items():
-                    videos_data_str += f"  {key}: {value}\n"
-                videos_data_str += "\n"
-            
-            # Create the message to send to Claude
-            message = f"{videos_data_str}\n\n{instruction}"
-            
-            # Get response from Claude
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1500,
-                messages=[
-                    {"role": "user", "content": message}
-                ]
-            )
-            
-            # Extract text from the response
-            return response.content[0].text
-            
+            key = key or self._result_key(kind, payload, instruction)
+            if key:
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    yield cached
+                    return
+
+            message = yield from self._prepare_with_progress(prepare)
+            parts = []
+            for text in self._stream(message, self.max_tokens[kind]):
+                parts.append(text)
+                yield text
+
+            if key:
+                self.result_cache.set(key, kind, self.model, "".join(parts))
         except Exception as e:
-            print(f"Error calling Claude API: {e}")
-            return f"Error analyzing videos: {str(e)}"
-    
-    def analyze_comments(self, comments, instruction):
+            # Counted as an error by whoever handles the AnalysisError
+            log_event('claude_error', label=label, error=str(e), error_type=type(e).__name__)
+            raise AnalysisError(f"Error analyzing {label}: {str(e)}") from e
+
+    def _map_chunks(self, chunks, build_message, max_tokens, max_concurrency=None, stage='map'):
+        """Run build_message(chunk) for every chunk through Claude concurrently and
+        return the responses in chunk order. Chunks are pulled lazily, so at most a
+        couple of batches' worth of input is held in memory at once. Each finished
+        chunk is reported to a streaming caller (total is None for lazy chunks)."""
+        max_concurrency = max_concurrency or self.max_concurrency
+        slots = threading.BoundedSemaphore(max_concurrency * 2)
+        report = _progress.get()
+        total = len(chunks) if isinstance(chunks, list) else None
+        finished = itertools.count(1)
+        finished_lock = threading.Lock()
+
+        def run(chunk):
+            try:
+                return self._complete(build_message(chunk), max_tokens)
+            finally:
+                slots.release()
+                if report is not None:
+                    with finished_lock:
+                        report(stage, next(finished), total)
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            for chunk in chunks:
+                slots.acquire()
+                futures.append(executor.submit(run, chunk))
+            return [future.result() for future in futures]
+
+    def _reduce_notes(self, notes, build_message, max_tokens, max_concurrency=None):
+        """Return the final reduce prompt for partial results, first merging them in
+        groups when together they would not fit in one prompt"""
+        while len(notes) > 1 and estimate_tokens("\n\n".join(notes)) > self.chunk_tokens:
+            groups = []
+            group, group_tokens = [], 0
+            for note in notes:
+                note_tokens = estimate_tokens(note)
+                if group and group_tokens + note_tokens > self.chunk_tokens:
+                    groups.append(group)
+                    group, group_tokens = [], 0
+                group.append(note)
+                group_tokens += note_tokens
+            groups.append(group)
+
+            if len(groups) == len(notes):
+                # Every note fills a prompt on its own; merging further cannot shrink them
+                break
+
+            notes = self._map_chunks(
+                groups,
+                self._build_merge_message,
+                max_tokens,
+                max_concurrency,
+                stage='merge'
+            )
+
+        return build_message(notes)
+
+    @staticmethod
+    def _build_merge_message(notes):
+        joined = "\n\n".join(f"Notes {i}:\n{note}" for i, note in enumerate(notes, 1))
+        return (
+            f"{joined}\n\n"
+            "The notes above were written about different parts of one dataset. "
+            "Merge them into a single set of notes, keeping every distinct finding with "
+            "the counts, quotes or time ranges that support it, and dropping repetition."
+        )
+
+    def _prepare_video_data(self, video_data, instruction):
+        # Cut the description to whatever the budget leaves after the other fields
+        fixed = serialize(video_data, FIELDS['video'], skip=('description',))
+        room = (self.prompt_tokens - estimate_tokens(fixed + instruction)) * 4
+        video_data_str = "Video Information:\n" + serialize(
+            video_data, FIELDS['video'],
+            limits={'description': max(min(room, TEXT_LIMITS['description']), 0)},
+            sep="\n"
+        )
+
+        # Create the message to send to Claude
+        return cacheable_message(video_data_str, instruction)
+
+    def analyze_video_data(self, video_data, instruction):
         """
-        Analyze video comments according to the given instruction
+        Analyze video data according to the given instruction
         """
-        try:
-            # Convert comments to string representation for prompt
-            comments_str = "Video Comments:\n\n"
-            for i, comment in enumerate(comments, 1):
-                comments_str += f"Comment {i}:\n"
-                for key, value in comment.items():
-                    if key != 'id':  # Skip technical IDs
-                        comments_str += f"  {key}: {value}\n"
-                comments_str += "\n"
-        
-            # Create the message to send to Claude
-            message = f"{comments_str}\n\n{instruction}"
-        
-            # Get response from Claude
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1000,
-                messages=[
-                    {"role": "user", "content": message}
-                ]
+        return self._analyze(
+            'video', video_data, instruction,
+            lambda: self._prepare_video_data(video_data, instruction),
+            "video data"
+        )
+
+    def stream_video_data(self, video_data, instruction):
+        """
+        Like analyze_video_data, but yields the response text as it is generated
+        """
+        return self._analyze_stream(
+            'video', video_data, instruction,
+            lambda: self._prepare_video_data(video_data, instruction),
+            "video data"
+        )
+
+    def _prepare_multiple_videos(self, videos_list, instruction, max_tokens=None):
+        """
+        Build one compact comparison prompt: a line of fields per video, with a
+        channel shared by every video stated once up front and each description
+        cut short enough for the whole list to fit max_tokens.
+        """
+        if max_tokens is None:
+            max_tokens = min(self.compare_tokens, self.prompt_tokens)
+
+        skip = ()
+        header = "Videos Information:\n"
+        # Computed locally over the whole list, so Claude gets exact figures to work from
+        engagement_str = summarize(engagement_metrics(videos_list))
+        if engagement_str:
+            header = engagement_str + "\n" + header
+        channels = {video.get('channel') for video in videos_list}
+        if len(videos_list) > 1 and len(channels) == 1 and channels != {None}:
+            skip = ('channel',)
+            header += f"All videos share channel: {channels.pop()}\n"
+
+        lines = [
+            f"Video {i} ({video['id']}): {serialize(video, FIELDS['compare'], skip=skip)}\n"
+            for i, video in enumerate(videos_list, 1)
+        ]
+        limit = fit_text_limit(
+            estimate_tokens(header + "".join(lines) + instruction), len(videos_list), max_tokens, 600
+        )
+
+        videos_data_str = header
+        for line, video in zip(lines, videos_list):
+            videos_data_str += "\n" + line
+            description = serialize(video, ('description',), limits={'description': limit})
+            if description:
+                videos_data_str += f"  {description}\n"
+
+        # Create the message to send to Claude
+        return cacheable_message(videos_data_str, instruction)
+
+    def analyze_multiple_videos(self, videos_list, instruction):
+        """
+        Analyze a list of videos according to the given instruction
+        """
+        return self._analyze(
+            'videos', videos_list, instruction,
+            lambda: self._prepare_multiple_videos(videos_list, instruction),
+            "videos"
+        )
+
+    def stream_multiple_videos(self, videos_list, instruction):
+        """
+        Like analyze_multiple_videos, but yields the response text as it is generated
+        """
+        return self._analyze_stream(
+            'videos', videos_list, instruction,
+            lambda: self._prepare_multiple_videos(videos_list, instruction),
+            "videos"
+        )
+
+    @staticmethod
+    def _comments_header(title, note):
+        return f"{title}:\n{note}\n\n" if note else f"{title}:\n\n"
+
+    def _prepare_comments(self, comments, instruction, note=None):
+        # Sample evenly across the comments when they do not all fit the budget
+        lines = [format_comment(i, comment) for i, comment in enumerate(comments, 1)]
+        kept = fit_lines(lines, self.prompt_tokens - estimate_tokens(instruction + (note or "")) - 50)
+
+        title = "Video Comments"
+        if len(kept) < len(lines):
+            title = f"Video Comments (an even sample of {len(kept)} of {len(lines)})"
+        comments_str = self._comments_header(title, note) + "".join(kept)
+
+        # Create the message to send to Claude
+        return cacheable_message(comments_str, instruction)
+
+    def analyze_comments(self, comments, instruction, note=None):
+        """
+        Analyze video comments according to the given instruction. note, such as
+        comment_preprocessing.describe(stats), tells Claude how they were selected.
+        """
+        comments = list(comments)
+        return self._analyze(
+            'comments', [comments, note], instruction,
+            lambda: self._prepare_comments(comments, instruction, note),
+            "comments"
+        )
+
+    def _chunk_comments(self, comments, chunk_tokens, key=None):
+        """Group formatted comments into chunks of roughly chunk_tokens tokens,
+        feeding each comment to key (a result_cache.ResultKey) when one is given"""
+        chunk, chunk_size = [], 0
+        for i, comment in enumerate(comments, 1):
+            if key is not None:
+                key.update(comment)
+            text = format_comment(i, comment)
+            size = estimate_tokens(text)
+            if chunk and chunk_size + size > chunk_tokens:
+                yield "".join(chunk)
+                chunk, chunk_size = [], 0
+            chunk.append(text)
+            chunk_size += size
+        if chunk:
+            yield "".join(chunk)
+
+    def _comment_chunks(self, comments, instruction, chunk_tokens=None, note=None):
+        """
+        Return (chunks, result cache key) for a chunked comment analysis. Without
+        a result cache the chunks stay lazy. With one, the comments are chunked
+        up front and hashed as they are formatted, so only the chunk text is
+        held while the cache is checked.
+        """
+        chunk_tokens = chunk_tokens or self.chunk_tokens
+        if self.result_cache is None:
+            return self._chunk_comments(comments, chunk_tokens), None
+
+        key = self.result_cache.new_key('comments', instruction, self.model, self.max_tokens['comments'])
+        key.update(note)
+        chunks = list(self._chunk_comments(comments, chunk_tokens, key))
+        return chunks, key.hexdigest()
+
+    def _prepare_comments_chunked(self, chunks, instruction, max_concurrency=None, note=None):
+        """Run the map phase over comment chunks and return the final reduce prompt"""
+        chunks = iter(chunks)
+
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            raise ValueError("No comments to analyze")
+
+        second_chunk = next(chunks, None)
+        if second_chunk is None:
+            # Everything fits in one prompt, so no reduce step is needed
+            return cacheable_message(self._comments_header("Video Comments", note) + first_chunk, instruction)
+
+        def build_map_message(chunk):
+            return cacheable_message(
+                self._comments_header("Video Comments (one batch of a larger set)", note) + chunk,
+                "Take concise notes on this batch that will help answer the instruction below. "
+                "Record themes, sentiment, how many comments support each point and a few "
+                "representative quotes. Your notes will be merged with notes on the other batches.\n\n"
+                f"Instruction: {instruction}"
             )
-        
-            return response.content[0].text
-        
-        except Exception as e:
-            print(f"Error calling Claude API: {e}")
-            return f"Error analyzing comments: {str(e)}"
-        
+
+        def build_reduce_message(notes):
+            joined = "\n\n".join(f"Batch {i} notes:\n{batch_notes}" for i, batch_notes in enumerate(notes, 1))
+            intro = f"The comments on a video were analyzed in {len(notes)} batches."
+            if note:
+                intro += f" {note}"
+            return (
+                f"{intro} Notes from each batch:\n\n{joined}\n\n"
+                f"Using all of the notes, respond to the following about the whole comment set:\n{instruction}"
+            )
+
+        notes = self._map_chunks(
+            itertools.chain([first_chunk, second_chunk], chunks),
+            build_map_message,
+            800,
+            max_concurrency
+        )
+        return self._reduce_notes(notes, build_reduce_message, self.max_tokens['comments'], max_concurrency)
+
+    def analyze_comments_chunked(self, comments, instruction, chunk_tokens=None, max_concurrency=None, note=None):
+        """
+        Analyze any number of comments with map-reduce: token-budgeted chunks are
+        analyzed concurrently, then the partial results are merged in a final call.
+        Accepts any iterable, including the iter_video_comments generator, and
+        holds no more than the formatted chunks at once. note is passed on as in
+        analyze_comments.
+        """
+        chunks, key = self._comment_chunks(comments, instruction, chunk_tokens, note)
+        return self._analyze(
+            'comments', None, instruction,
+            lambda: self._prepare_comments_chunked(chunks, instruction, max_concurrency, note),
+            "comments",
+            key=key
+        )
+
+    def stream_comments_chunked(self, comments, instruction, chunk_tokens=None, max_concurrency=None, note=None):
+        """
+        Like analyze_comments_chunked, but yields the final merged response as it is generated
+        """
+        chunks, key = self._comment_chunks(comments, instruction, chunk_tokens, note)
+        return self._analyze_stream(
+            'comments', None, instruction,
+            lambda: self._prepare_comments_chunked(chunks, instruction, max_concurrency, note),
+            "comments",
+            key=key
+        )
+
+    def _prepare_channel_data(self, channel_data, videos_data, instruction):
+        channel_str = "Channel Information:\n" + serialize(channel_data, FIELDS['channel'], sep="\n")
+        engagement_str = summarize(engagement_metrics(videos_data))
+        if engagement_str:
+            channel_str += "\n\n" + engagement_str
+
+        # Drop an even share of the videos if the list does not fit the budget
+        lines = [
+            f"Video {i} ({video['id']}): {serialize(video, FIELDS['channel_video'])}\n"
+            for i, video in enumerate(videos_data, 1)
+        ]
+        lines = fit_lines(lines, self.prompt_tokens - estimate_tokens(channel_str + instruction) - 50)
+        videos_str = "\nRecent Videos:\n" + "".join(lines)
+
+        # Create the message to send to Claude
+        return cacheable_message(f"{channel_str}\n{videos_str}", instruction)
+
     def analyze_channel_data(self, channel_data, videos_data, instruction):
         """
         Analyze channel and its videos according to the given instruction
         """
-        try:
-            # Convert channel data to string representation for prompt
-            channel_str = "Channel Information:\n"
-            for key, value in channel_data.items():
-                if key != 'playlist_id':  # Skip technical details
-                    channel_str += f"{key}: {value}\n"
-        
-            # Add video data
-            videos_str = "\nRecent Videos:\n"
-            for i, video in enumerate(videos_data, 1):
-                videos_str += f"\nVideo {i}:\n"
-                for key, value in video.items():
-                    if key in ['id', 'title', 'published_at', 'view_count']:
-                        videos_str += f"  {key}: {value}\n"
-        
-            # Create the message to send to Claude
-            message = f"{channel_str}\n{videos_str}\n\n{instruction}"
-        
-            # Get response from Claude
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1500,
-                messages=[
-                    {"role": "user", "content": message}
-                ]
+        return self._analyze(
+            'channel', [channel_data, videos_data], instruction,
+            lambda: self._prepare_channel_data(channel_data, videos_data, instruction),
+            "channel data"
+        )
+
+    def stream_channel_data(self, channel_data, videos_data, instruction):
+        """
+        Like analyze_channel_data, but yields the response text as it is generated
+        """
+        return self._analyze_stream(
+            'channel', [channel_data, videos_data], instruction,
+            lambda: self._prepare_channel_data(channel_data, videos_data, instruction),
+            "channel data"
+        )
+
+    def _prepare_transcript(self, windows, instruction, max_concurrency=None):
+        """Summarize transcript windows in parallel and return the final combining prompt"""
+        if not windows:
+            raise ValueError("No transcript to analyze")
+
+        if len(windows) == 1:
+            return cacheable_message(
+                f"Video Transcript [{windows[0]['range']}]:\n{windows[0]['text']}",
+                f"{instruction}\n\n"
+                "Cite the time ranges (for example [2:10-3:45]) that support each finding, "
+                "using the inline timestamps in the transcript."
             )
-        
-            # Extract text from the response
-            return response.content[0].text
-        
-        except Exception as e:
-            print(f"Error calling Claude API: {e}")
-            return f"Error analyzing channel data: {str(e)}"
\ No newline at end of file
+
+        def build_map_message(window):
+            return cacheable_message(
+                f"Video Transcript excerpt [{window['range']}]:\n{window['text']}",
+                "Take concise notes on this excerpt that will help answer the instruction below. "
+                "Tag every note with the time range it comes from, such as [12:05-13:40], using "
+                "the inline timestamps. Your notes will be merged with notes on the rest of the video.\n\n"
+                f"Instruction: {instruction}"
+            )
+
+        def build_reduce_message(notes):
+            joined = "\n\n".join(notes)
+            return (
+                f"A long video transcript was analyzed in {len(windows)} overlapping excerpts. "
+                f"Notes from the excerpts, tagged with time ranges:\n\n{joined}\n\n"
+                f"Using all of the notes, respond to the following about the whole video:\n{instruction}\n\n"
+                "Keep the time ranges that support each finding."
+            )
+
+        notes = self._map_chunks(windows, build_map_message, 800, max_concurrency)
+        notes = [f"Excerpt [{window['range']}] notes:\n{note}" for window, note in zip(windows, notes)]
+        return self._reduce_notes(notes, build_reduce_message, self.max_tokens['transcript'], max_concurrency)
+
+    def analyze_transcript(self, windows, instruction, max_concurrency=None):
+        """
+        Analyze a transcript split into timed windows (see transcript_pipeline).
+        Windows are summarized in parallel and combined hierarchically; findings
+        cite the [m:ss-m:ss] time ranges that support them.
+        """
+        return self._analyze(
+            'transcript', windows, instruction,
+            lambda: self._prepare_transcript(windows, instruction, max_concurrency),
+            "transcript"
+        )
+
+    def stream_transcript(self, windows, instruction, max_concurrency=None):
+        """
+        Like analyze_transcript, but yields the combined response as it is generated
+        """
+        return self._analyze_stream(
+            'transcript', windows, instruction,
+            lambda: self._prepare_transcript(windows, instruction, max_concurrency),
+            "transcript"
+        )
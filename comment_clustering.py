@@ -0,0 +1,201 @@
+import math
+import re
+from collections import Counter
+import numpy as np
+from scipy import sparse
+from comment_preprocessing import MENTION, URL
+
+TOKEN = re.compile(r"[^\W\d_]{2,}")
+
+STOP_WORDS = frozenset("""
+a about after again all also am an and any are as at be because been before being but by can could
+did do does doing don dont for from get got had has have having he her here him his how if im in into
+is it its ive just like me more most my no not now of on one only or other our out over really so
+some than that thats the their them then there these they this those through to too up us very was
+we were what when where which while who why will with would you your youre
+""".split())
+
+# Default cluster count grows with the comment set up to this many
+MAX_CLUSTERS = 20
+
+# Terms need to occur in at least MIN_DF comments and at most MAX_DF of them
+MIN_DF = 2
+MAX_DF = 0.5
+MAX_FEATURES = 20000
+
+
+def tokenize(text):
+    text = MENTION.sub(' ', URL.sub(' ', text.casefold()))
+    return [word for word in TOKEN.findall(text) if word not in STOP_WORDS]
+
+
+def tfidf_matrix(documents):
+    """
+    L2-normalized TF-IDF rows (sublinear term frequency, smoothed IDF) of
+    tokenized documents as a float32 CSR matrix, and the term of each column.
+    Very rare and very common terms are left out of the vocabulary.
+    """
+    n = len(documents)
+    document_frequency = Counter()
+    for tokens in documents:
+        document_frequency.update(set(tokens))
+
+    min_df = MIN_DF if n >= 50 else 1
+    max_df = MAX_DF * n if n >= 20 else n
+    terms = [term for term, count in document_frequency.items() if min_df <= count <= max_df]
+    if len(terms) > MAX_FEATURES:
+        terms = sorted(terms, key=lambda term: -document_frequency[term])[:MAX_FEATURES]
+    vocabulary = {term: i for i, term in enumerate(terms)}
+
+    indices, indptr = [], [0]
+    for tokens in documents:
+        indices.extend(vocabulary[token] for token in tokens if token in vocabulary)
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(n, len(terms))
+    )
+    matrix.sum_duplicates()
+
+    idf = np.log((1 + n) / (1 + np.array([document_frequency[term] for term in terms], dtype=np.float32))) + 1
+    matrix.data = (1 + np.log(matrix.data)) * idf[matrix.indices]
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms).astype(np.float32) @ matrix).tocsr(), terms
+
+
+def _normalize_rows(centers):
+    norms = np.linalg.norm(centers, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return centers / norms
+
+
+def _init_centers(matrix, k, rng, sample_size=2000):
+    """k-means++ seeding on a sample of the rows, with cosine distance"""
+    sample = matrix[rng.choice(matrix.shape[0], min(matrix.shape[0], max(sample_size, 10 * k)), replace=False)]
+    centers = [sample[rng.integers(sample.shape[0])].toarray().ravel()]
+    distance = np.maximum(1 - sample @ centers[0], 0)
+    for _ in range(1, k):
+        total = distance.sum()
+        index = rng.choice(sample.shape[0], p=distance / total) if total > 0 else rng.integers(sample.shape[0])
+        centers.append(sample[index].toarray().ravel())
+        distance = np.minimum(distance, np.maximum(1 - sample @ centers[-1], 0))
+    return np.vstack(centers)
+
+
+def spherical_kmeans(matrix, k, weights=None, batch_size=1024, max_iter=100, tol=1e-4, seed=0):
+    """
+    Mini-batch k-means (Sculley, 2010) on L2-normalized rows with cosine
+    similarity: each step assigns a random batch to its nearest centers, moves
+    them by per-center decaying learning rates and renormalizes. Returns the
+    (k, columns) array of unit-length centers.
+    """
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    centers = _init_centers(matrix, k, rng)
+    counts = np.zeros(k)
+
+    for _ in range(max_iter):
+        batch = rng.choice(n, batch_size, replace=False) if n > batch_size else np.arange(n)
+        rows, batch_weights = matrix[batch], weights[batch]
+        labels = np.asarray(rows @ centers.T).argmax(axis=1)
+
+        assignment = sparse.csr_matrix((batch_weights, (labels, np.arange(len(batch)))), shape=(k, len(batch)))
+        sums = (assignment @ rows).toarray()
+        batch_counts = np.bincount(labels, weights=batch_weights, minlength=k)
+        counts += batch_counts
+
+        moved = batch_counts > 0
+        updated = centers.copy()
+        updated[moved] += (sums[moved] - batch_counts[moved, None] * centers[moved]) / counts[moved, None]
+        updated = _normalize_rows(updated)
+        shift = np.abs(updated - centers).sum(axis=1).max()
+        centers = updated
+        if shift < tol:
+            break
+    return centers
+
+
+def default_clusters(count):
+    return max(2, min(MAX_CLUSTERS, round(math.sqrt(count / 10))))
+
+
+def cluster_comments(comments, k=None, top_terms=8, representatives=3, seed=0):
+    """
+    Group comments into themes: TF-IDF vectors, mini-batch spherical k-means,
+    then per cluster its size (counting each comment's 'copies'), share, top
+    terms and the comments closest to its center. Comments with no usable
+    terms are counted as unclustered. Clusters are returned largest first.
+    """
+    comments = list(comments)
+    documents = [tokenize(comment['text']) for comment in comments]
+    matrix, terms = tfidf_matrix(documents)
+
+    clustered = np.flatnonzero(matrix.getnnz(axis=1) > 0)
+    weights = np.array([comments[i].get('copies', 1) for i in clustered], dtype=np.float64)
+    total_weight = sum(comment.get('copies', 1) for comment in comments)
+    result = {
+        'count': int(total_weight),
+        'clustered': int(weights.sum()),
+        'unclustered': int(total_weight - weights.sum()),
+        'clusters': []
+    }
+    if clustered.size < 2:
+        return result
+
+    matrix = matrix[clustered]
+    k = min(k or default_clusters(clustered.size), clustered.size)
+    centers = spherical_kmeans(matrix, k, weights, seed=seed)
+
+    similarity = np.asarray(matrix @ centers.T)
+    labels = similarity.argmax(axis=1)
+    best = similarity[np.arange(len(labels)), labels]
+
+    clusters = []
+    for cluster in range(k):
+        members = np.flatnonzero(labels == cluster)
+        if not members.size:
+            continue
+        closest = members[np.argsort(-best[members], kind='stable')[:representatives]]
+        size = int(weights[members].sum())
+        clusters.append({
+            'size': size,
+            'share': round(size / total_weight, 4),
+            'like_count': int(sum(int(comments[clustered[i]].get('like_count') or 0) for i in members)),
+            'top_terms': [terms[j] for j in np.argsort(-centers[cluster])[:top_terms] if centers[cluster, j] > 0],
+            'representatives': [
+                dict(comments[clustered[i]], similarity=round(float(best[i]), 3)) for i in closest
+            ]
+        })
+
+    clusters.sort(key=lambda cluster: -cluster['size'])
+    for theme, cluster in enumerate(clusters, 1):
+        cluster['theme'] = theme
+    result['clusters'] = clusters
+    return result
+
+
+def cluster_representatives(result):
+    """The representative comments of every cluster, tagged with their theme, for analyze_comments"""
+    return [
+        dict({key: value for key, value in comment.items() if key != 'similarity'}, theme=cluster['theme'])
+        for cluster in result['clusters']
+        for comment in cluster['representatives']
+    ]
+
+
+def describe_clusters(result):
+    """Lines telling Claude what each theme stands for, to go with cluster_representatives"""
+    lines = [
+        f"The {result['count']} comments were grouped into {len(result['clusters'])} themes by local clustering; "
+        "only the comments closest to each theme's center are shown, tagged with 'theme'."
+    ]
+    for cluster in result['clusters']:
+        lines.append(
+            f"Theme {cluster['theme']}: {cluster['size']} comments ({100 * cluster['share']:.1f}%), "
+            f"{cluster['like_count']} likes; terms: {', '.join(cluster['top_terms'])}"
+        )
+    if result['unclustered']:
+        lines.append(f"{result['unclustered']} comments had no usable words and were left out.")
+    return "\n".join(lines)
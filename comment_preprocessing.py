@@ -0,0 +1,253 @@
+import math
+import random
+import re
+from collections import defaultdict
+import numpy as np
+from prompts import estimate_tokens, format_comment
+
+# Comments with fewer words than this ("first", "lol", emoji-only) carry no usable opinion
+MIN_WORDS = 2
+
+URL = re.compile(r'(?:https?://|www\.)\S+', re.IGNORECASE)
+MENTION = re.compile(r'@\S+')
+WORD = re.compile(r'[^\W\d_]{2,}')
+# Scripts written without spaces between words (Thai, Lao, Myanmar, Khmer,
+# Chinese, Japanese kana and kanji): words are counted from their characters
+UNSPACED = re.compile(r'[\u0e00-\u0eff\u1000-\u109f\u1780-\u17ff\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+UNSPACED_CHARS_PER_WORD = 2
+SPAM = re.compile(
+    r'\bsub ?4 ?sub\b|\bsubscribe to (?:me|my)\b|\bcheck (?:out )?my (?:channel|videos?|page)\b'
+    r'|\bvisit my channel\b|\b(?:whats ?app|telegram)\b.{0,20}\+?\d[\d \-]{6,}|\bearn \$?\d'
+    r'|\bfree (?:robux|v-?bucks|gift ?cards?)\b',
+    re.IGNORECASE
+)
+
+# MinHash signatures of NUM_PERM hashes over SHINGLE-byte shingles, split into
+# LSH_BANDS bands; pairs sharing a band are compared and merged at NEAR_DUPLICATE
+NUM_PERM = 64
+LSH_BANDS = 16
+SHINGLE = 5
+NEAR_DUPLICATE = 0.8
+MAX_SHINGLED_CHARS = 1000
+# Bounds on the near-duplicate pass: a band bucket keeps its MAX_BUCKET
+# most-liked members, only the MAX_NEAR_DUPLICATE_COMMENTS most-liked unique
+# comments are checked, and signatures are hashed MINHASH_BATCH shingles at a time
+MAX_BUCKET = 32
+MAX_NEAR_DUPLICATE_COMMENTS = 50000
+MINHASH_BATCH = 1 << 16
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(1)
+_HASH_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_HASH_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 1 << 63, NUM_PERM // LSH_BANDS, dtype=np.uint64) | np.uint64(1)
+
+# Sampling strata: like counts by order of magnitude, dates by equal-count quantile
+LIKE_BANDS = 4
+TIME_BANDS = 4
+
+
+def normalize(text):
+    """Lowercase words of a comment without links, mentions or punctuation"""
+    text = MENTION.sub(' ', URL.sub(' ', text.casefold()))
+    return " ".join(re.findall(r'\w+', text))
+
+
+def word_count(text):
+    """Words of two or more letters, with every UNSPACED_CHARS_PER_WORD characters
+    of an unspaced script counted as a word"""
+    unspaced = len(UNSPACED.findall(text))
+    return len(WORD.findall(UNSPACED.sub(' ', text))) + unspaced // UNSPACED_CHARS_PER_WORD
+
+
+def is_spam(text):
+    links = URL.findall(text)
+    if len(links) >= 2:
+        return True
+    # A bare link with a word or two of bait
+    if links and word_count(URL.sub(' ', text)) < 3:
+        return True
+    return bool(SPAM.search(text))
+
+
+def is_low_information(text):
+    return word_count(MENTION.sub(' ', URL.sub(' ', text))) < MIN_WORDS
+
+
+def minhash_signatures(texts):
+    """
+    MinHash signatures of the SHINGLE-byte shingles of the UTF-8 encoded
+    normalized texts, one row per text, hashed in numpy MINHASH_BATCH
+    shingles at a time.
+    """
+    encoded = [text[:MAX_SHINGLED_CHARS].encode('utf-8').ljust(SHINGLE, b'\0') for text in texts]
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint64)
+    start = 0
+    while start < len(encoded):
+        end, size = start, 0
+        while end < len(encoded) and size < MINHASH_BATCH:
+            size += len(encoded[end]) - SHINGLE + 1
+            end += 1
+
+        data = np.frombuffer(b''.join(encoded[start:end]), dtype=np.uint8).astype(np.uint64)
+        lengths = np.array([len(text) for text in encoded[start:end]])
+        # Pack the bytes of every window into one integer, then drop the
+        # windows that run past the end of their text
+        windows = np.zeros(len(data) - SHINGLE + 1, dtype=np.uint64)
+        for k in range(SHINGLE):
+            windows |= data[k:len(windows) + k] << np.uint64(8 * k)
+        text_ends = np.cumsum(lengths)
+        owner = np.repeat(np.arange(end - start), lengths)[:len(windows)]
+        hashes = windows[np.arange(len(windows)) <= (text_ends - SHINGLE)[owner]] % _PRIME
+
+        offsets = np.concatenate(([0], np.cumsum(lengths - SHINGLE + 1)[:-1]))
+        permuted = (_HASH_A[:, None] * hashes[None, :] + _HASH_B[:, None]) % _PRIME
+        signatures[start:end] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        start = end
+    return signatures
+
+
+def minhash(text):
+    """MinHash signature of the shingles of normalized text"""
+    return minhash_signatures([text])[0]
+
+
+def collapse_duplicates(comments):
+    """
+    Merge exact duplicates (same normalized text) and then near-duplicates
+    (MinHash similarity of at least NEAR_DUPLICATE) into the most-liked copy,
+    which gets a 'copies' count of the comments it stands for. Only the
+    MAX_NEAR_DUPLICATE_COMMENTS most-liked unique comments are checked for
+    near-duplicates. Returns (representatives in input order, exact
+    duplicates, near duplicates).
+    """
+    order = sorted(range(len(comments)), key=lambda i: -int(comments[i].get('like_count') or 0))
+    keys = [normalize(comment['text']) for comment in comments]
+
+    copies = {}
+    exact = {}
+    for i in order:
+        if keys[i] in exact:
+            copies[exact[keys[i]]] += 1
+        else:
+            exact[keys[i]] = i
+            copies[i] = 1
+    exact_duplicates = len(comments) - len(copies)
+
+    unique = [i for i in order if i in copies][:MAX_NEAR_DUPLICATE_COMMENTS]
+    signatures = minhash_signatures([keys[i] for i in unique])
+    rows_per_band = NUM_PERM // LSH_BANDS
+    # One integer per band: the band's rows mixed by multiply-add, wrapping at 2**64
+    band_keys = (signatures.reshape(len(unique), LSH_BANDS, rows_per_band) * _BAND_MIX).sum(axis=2).tolist()
+
+    buckets = [{} for _ in range(LSH_BANDS)]
+    near_duplicates = 0
+    for row, i in enumerate(unique):
+        bands = [(bucket, bucket.get(key), key) for bucket, key in zip(buckets, band_keys[row])]
+        candidates = list(dict.fromkeys(j for _, members, _ in bands if members for j in members))
+        if candidates:
+            similarity = (signatures[candidates] == signatures[row]).mean(axis=1)
+            best = int(similarity.argmax())
+            if similarity[best] >= NEAR_DUPLICATE:
+                copies[unique[candidates[best]]] += copies.pop(i)
+                near_duplicates += 1
+                continue
+        for bucket, members, key in bands:
+            if members is None:
+                bucket[key] = [row]
+            elif len(members) < MAX_BUCKET:
+                members.append(row)
+
+    representatives = []
+    for i in sorted(copies):
+        comment = comments[i]
+        if copies[i] > 1:
+            comment = dict(comment, copies=copies[i])
+        representatives.append(comment)
+    return representatives, exact_duplicates, near_duplicates
+
+
+def stratified_sample(comments, token_budget, seed=0):
+    """
+    Comments whose prompt lines fit token_budget, sampled across like-count and
+    date strata in proportion to how many comments each stratum stands for.
+    Within a stratum, comments standing for more copies are likelier to be
+    picked. The seed is fixed so the same comments give the same sample.
+    """
+    costs = [estimate_tokens(format_comment(i, comment)) for i, comment in enumerate(comments, 1)]
+    if sum(costs) <= token_budget:
+        return list(comments)
+
+    by_date = sorted(range(len(comments)), key=lambda i: comments[i].get('published_at') or '')
+    time_band = {i: rank * TIME_BANDS // len(comments) for rank, i in enumerate(by_date)}
+
+    rng = random.Random(seed)
+    strata = defaultdict(list)
+    priority = {}
+    for i, comment in enumerate(comments):
+        likes = int(comment.get('like_count') or 0)
+        like_band = min(int(math.log10(likes)) + 1, LIKE_BANDS - 1) if likes > 0 else 0
+        strata[like_band, time_band[i]].append(i)
+        # Weighted sampling without replacement (Efraimidis-Spirakis keys)
+        priority[i] = rng.random() ** (1 / comment.get('copies', 1))
+
+    total_weight = sum(comment.get('copies', 1) for comment in comments)
+    chosen, spent = set(), 0
+    for members in strata.values():
+        members.sort(key=lambda i: -priority[i])
+        share = token_budget * sum(comments[i].get('copies', 1) for i in members) / total_weight
+        used = 0
+        for i in members:
+            if used + costs[i] > share:
+                break
+            chosen.add(i)
+            used += costs[i]
+        spent += used
+
+    # Spend what the strata left over on the highest-priority remaining comments
+    for i in sorted(set(range(len(comments))) - chosen, key=lambda i: -priority[i]):
+        if spent + costs[i] <= token_budget:
+            chosen.add(i)
+            spent += costs[i]
+
+    return [comments[i] for i in sorted(chosen)]
+
+
+def preprocess_comments(comments, token_budget=None, seed=0):
+    """
+    Shrink a comment set before it is sent to Claude: drop spam and
+    low-information comments, collapse exact and near-duplicates into counted
+    representatives, then take a stratified sample that fits token_budget
+    (all of them when token_budget is None). Returns (comments, stats).
+    """
+    comments = list(comments)
+    stats = {'received': len(comments), 'spam': 0, 'low_information': 0}
+
+    kept = []
+    for comment in comments:
+        if is_spam(comment['text']):
+            stats['spam'] += 1
+        elif is_low_information(comment['text']):
+            stats['low_information'] += 1
+        else:
+            kept.append(comment)
+
+    unique, stats['exact_duplicates'], stats['near_duplicates'] = collapse_duplicates(kept)
+    sample = stratified_sample(unique, token_budget, seed) if token_budget is not None else unique
+    stats['unique'] = len(unique)
+    stats['sampled'] = len(sample)
+    return sample, stats
+
+
+def describe(stats):
+    """One line telling Claude how the comments it sees were selected"""
+    parts = [f"{stats['received']} comments were collected"]
+    if stats['spam'] or stats['low_information']:
+        parts.append(f"{stats['spam']} spam and {stats['low_information']} low-information comments were removed")
+    if stats['exact_duplicates'] or stats['near_duplicates']:
+        parts.append(
+            f"{stats['exact_duplicates'] + stats['near_duplicates']} duplicates were merged "
+            "('copies' is how many comments one stands for)"
+        )
+    if stats['sampled'] < stats['unique']:
+        parts.append(f"these {stats['sampled']} of the {stats['unique']} remaining are a sample stratified by likes and date")
+    return "; ".join(parts) + "."
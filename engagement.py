@@ -0,0 +1,191 @@
+import re
+import time
+from datetime import datetime
+import numpy as np
+from prompts import truncate
+
+# ISO-8601 durations as used by contentDetails.duration, e.g. PT1H2M3S or P1DT2M
+ISO_DURATION = re.compile(
+    r'^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?'
+    r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$'
+)
+DURATION_UNITS = {'weeks': 604800, 'days': 86400, 'hours': 3600, 'minutes': 60, 'seconds': 1}
+
+# Views per day are measured over at least this many days, so hour-old uploads don't dominate
+MIN_AGE_DAYS = 1 / 24
+
+# Videos whose views-per-day z-score reaches this are reported as outliers
+OUTLIER_Z = 2.0
+
+# Fewer videos than this say too little about each other to summarize
+SUMMARY_MIN_VIDEOS = 3
+
+
+def parse_duration(value):
+    """Seconds in an ISO-8601 duration, or NaN if it is missing or malformed"""
+    match = ISO_DURATION.match(value or '')
+    parts = {unit: float(amount) for unit, amount in match.groupdict().items() if amount} if match else {}
+    if not parts:
+        return np.nan
+    return sum(amount * DURATION_UNITS[unit] for unit, amount in parts.items())
+
+
+def parse_timestamp(value):
+    """Unix time of an RFC 3339 timestamp such as 2024-01-31T12:00:00Z, or NaN"""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return np.nan
+
+
+def parse_count(value):
+    """A count sent as a string (or number), or NaN if it is missing or malformed"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_columns(videos, now=None):
+    """
+    NumPy columns from video detail records: counts as float64 (the API sends
+    them as strings), durations in seconds and ages in days. Values that are
+    missing or unparseable are NaN; a hidden like count is not zero likes.
+    """
+    now = now if now is not None else time.time()
+
+    def counts(key):
+        return np.array([parse_count(video.get(key)) for video in videos], dtype=np.float64)
+
+    published = np.array([parse_timestamp(video.get('published_at')) for video in videos], dtype=np.float64)
+    return {
+        'views': counts('view_count'),
+        'likes': counts('like_count'),
+        'comments': counts('comment_count'),
+        'duration': np.array([parse_duration(video.get('duration')) for video in videos], dtype=np.float64),
+        'age_days': (now - published) / 86400
+    }
+
+
+def zscores(values):
+    """Standard scores of values, ignoring NaNs; 0 when every value is the same"""
+    if np.isnan(values).all():
+        return np.full(len(values), np.nan)
+    mean = np.nanmean(values)
+    std = np.nanstd(values)
+    if not std:
+        return np.where(np.isnan(values), np.nan, 0.0)
+    return (values - mean) / std
+
+
+def percentile_ranks(values):
+    """Percent of values at or below each value (ties share their mean rank); NaNs stay NaN"""
+    valid = np.sort(values[~np.isnan(values)])
+    if not len(valid):
+        return np.full(len(values), np.nan)
+    below = np.searchsorted(valid, values, side='left')
+    at_or_below = np.searchsorted(valid, values, side='right')
+    ranks = 100 * (below + at_or_below) / (2 * len(valid))
+    return np.where(np.isnan(values), np.nan, ranks)
+
+
+def _json_value(value, digits):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def _json_count(value):
+    return None if np.isnan(value) else int(value)
+
+
+def engagement_metrics(videos, now=None, outlier_z=OUTLIER_Z):
+    """
+    Engagement of a set of videos computed column-wise: like, comment and
+    engagement rates, views per day since publishing, z-scores and percentile
+    ranks within the set, and the over- and under-performers by views per day.
+    Views per day are compared on a log scale, since view counts are heavy-tailed.
+    """
+    columns = build_columns(videos, now)
+    views, likes, comments = columns['views'], columns['likes'], columns['comments']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        has_views = views > 0
+        like_rate = np.where(has_views, likes / views, np.nan)
+        comment_rate = np.where(has_views, comments / views, np.nan)
+        engagement_rate = np.where(has_views, (likes + comments) / views, np.nan)
+    views_per_day = views / np.maximum(columns['age_days'], MIN_AGE_DAYS)
+
+    velocity_z = zscores(np.log1p(views_per_day))
+    engagement_z = zscores(engagement_rate)
+    metrics = {
+        'views_percentile': percentile_ranks(views),
+        'views_per_day_percentile': percentile_ranks(views_per_day),
+        'engagement_percentile': percentile_ranks(engagement_rate)
+    }
+
+    rows = []
+    for i, video in enumerate(videos):
+        rows.append({
+            'id': video['id'],
+            'title': video.get('title'),
+            'published_at': video.get('published_at'),
+            'duration_seconds': _json_value(columns['duration'][i], 0),
+            'age_days': _json_value(columns['age_days'][i], 2),
+            'views': _json_count(views[i]),
+            'likes': _json_count(likes[i]),
+            'comments': _json_count(comments[i]),
+            'like_rate': _json_value(like_rate[i], 5),
+            'comment_rate': _json_value(comment_rate[i], 5),
+            'engagement_rate': _json_value(engagement_rate[i], 5),
+            'views_per_day': _json_value(views_per_day[i], 1),
+            'views_per_day_z': _json_value(velocity_z[i], 2),
+            'engagement_z': _json_value(engagement_z[i], 2),
+            **{name: _json_value(values[i], 1) for name, values in metrics.items()}
+        })
+
+    def summary(values, digits):
+        if np.isnan(values).all():
+            return None
+        p10, median, p90 = np.nanpercentile(values, [10, 50, 90])
+        return {'mean': round(float(np.nanmean(values)), digits), 'median': round(float(median), digits),
+                'p10': round(float(p10), digits), 'p90': round(float(p90), digits)}
+
+    order = np.argsort(-np.nan_to_num(velocity_z, nan=0.0), kind='stable')
+    return {
+        'count': len(videos),
+        'summary': {
+            'views': summary(views, 0),
+            'views_per_day': summary(views_per_day, 1),
+            'like_rate': summary(like_rate, 5),
+            'comment_rate': summary(comment_rate, 5),
+            'engagement_rate': summary(engagement_rate, 5),
+            'duration_seconds': summary(columns['duration'], 0)
+        },
+        'outliers': {
+            'over': [videos[i]['id'] for i in order if velocity_z[i] >= outlier_z],
+            'under': [videos[i]['id'] for i in order[::-1] if velocity_z[i] <= -outlier_z]
+        },
+        'videos': rows
+    }
+
+
+def summarize(metrics, limit=5):
+    """A few lines describing engagement metrics, for adding to prompts"""
+    summary = metrics['summary']
+    if metrics['count'] < SUMMARY_MIN_VIDEOS or summary['views_per_day'] is None:
+        return ""
+
+    line = (f"Engagement across {metrics['count']} videos: median {summary['views']['median']:.0f} views, "
+            f"{summary['views_per_day']['median']:.0f} views/day")
+    if summary['engagement_rate'] is not None:
+        line += f", {100 * summary['engagement_rate']['median']:.2f}% (likes + comments) / views"
+    lines = [line + "."]
+    by_id = {row['id']: row for row in metrics['videos']}
+    for label, key in (("Over-performing", 'over'), ("Under-performing", 'under')):
+        outliers = metrics['outliers'][key][:limit]
+        if outliers:
+            lines.append(f"{label} by views/day: " + "; ".join(
+                f"{truncate(by_id[video_id]['title'] or '', 80)} ({video_id}): {by_id[video_id]['views_per_day']:.0f}/day, "
+                f"z {by_id[video_id]['views_per_day_z']:+.1f}"
+                for video_id in outliers
+            ))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,149 @@
+import json
+import threading
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from metrics import error_source, log_error, log_event, trace_id
+from models import db, Analysis, Job
+
+
+class JobManager:
+    """
+    Runs analysis jobs in the background on a thread pool. Jobs are persisted in
+    the Job table, so status survives the request that submitted them, and each
+    user has at most max_per_user jobs running at once; the rest wait in order.
+    """
+
+    def __init__(self, app, handlers, max_workers=4, max_per_user=2):
+        self.app = app
+        self.handlers = handlers  # job type -> callable(params) returning a result dict
+        self.max_per_user = max_per_user
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+
+        self._running = defaultdict(int)  # user_id -> jobs handed to the executor
+        self._waiting = defaultdict(deque)  # user_id -> job IDs over the per-user limit
+        self._lock = threading.Lock()
+
+    def fail_interrupted(self):
+        """
+        Fail jobs left running by a server that stopped. Run this once per deploy,
+        before the workers start (flask recover-jobs): every worker process has its
+        own JobManager and cannot tell another worker's running jobs from dead ones.
+        Call resume() only after it.
+        """
+        with self.app.app_context():
+            count = Job.query.filter_by(status='running').update({
+                'status': 'failed',
+                'error': 'Interrupted by a server restart',
+                'finished_at': datetime.utcnow()
+            })
+            db.session.commit()
+        return count
+
+    def resume(self):
+        """Queue again the jobs that never started; each is claimed by one worker only"""
+        with self.app.app_context():
+            queued = Job.query.filter_by(status='queued').order_by(Job.created_at).all()
+            for job in queued:
+                self._enqueue(job.user_id, job.id)
+
+    def submit(self, user_id, job_type, params, save=False):
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        job = Job(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            type=job_type,
+            status='queued',
+            params=json.dumps(dict(params, save=bool(save))),
+            created_at=datetime.utcnow()
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        self._enqueue(user_id, job.id)
+        return job
+
+    def _enqueue(self, user_id, job_id):
+        with self._lock:
+            if self._running[user_id] >= self.max_per_user:
+                self._waiting[user_id].append(job_id)
+                return
+            self._running[user_id] += 1
+
+        self.executor.submit(self._run, user_id, job_id)
+
+    def _release(self, user_id):
+        with self._lock:
+            if self._waiting[user_id]:
+                # Hand this user's slot straight to their next waiting job
+                next_job_id = self._waiting[user_id].popleft()
+            else:
+                self._running[user_id] -= 1
+                return
+
+        self.executor.submit(self._run, user_id, next_job_id)
+
+    def _run(self, user_id, job_id):
+        # Log lines and upstream calls made by the job carry its ID as their trace
+        trace_id.set(f"job-{job_id}")
+        error_source.set('job')
+        try:
+            with self.app.app_context():
+                self._execute(job_id)
+        except Exception as e:
+            log_error('job_error', e, job_id=job_id)
+        finally:
+            self._release(user_id)
+
+    def _execute(self, job_id):
+        # Claim the job atomically, so a job queued in several worker processes runs once
+        claimed = Job.query.filter_by(id=job_id, status='queued').update({
+            'status': 'running',
+            'started_at': datetime.utcnow()
+        })
+        db.session.commit()
+        if not claimed:
+            return
+
+        job = Job.query.get(job_id)
+        error_source.set(f"job:{job.type}")
+
+        fields = {}
+        try:
+            params = json.loads(job.params)
+            result = self.handlers[job.type](params)
+            fields['result'] = json.dumps(result)
+
+            if params.get('save') and params.get('video_id') and 'analysis' in result:
+                analysis = Analysis(
+                    user_id=job.user_id,
+                    type=job.type,
+                    video_id=params['video_id'],
+                    instruction=params.get('instruction'),
+                    content=result['analysis'],
+                    created_at=datetime.utcnow()
+                )
+                db.session.add(analysis)
+                db.session.flush()
+                fields['analysis_id'] = analysis.id
+
+            fields['status'] = 'done'
+        except Exception as e:
+            db.session.rollback()
+            log_error('job_failed', e, job_type=job.type)
+            fields = {'status': 'failed', 'error': str(e)}
+
+        fields['finished_at'] = datetime.utcnow()
+        # Only a job still running is finished, so one failed by fail_interrupted stays failed
+        finished = Job.query.filter_by(id=job_id, status='running').update(fields)
+        if not finished:
+            db.session.rollback()
+            return
+        db.session.commit()
+        log_event(
+            'job_finished', job_type=job.type, status=fields['status'],
+            seconds=round((fields['finished_at'] - job.started_at).total_seconds(), 3)
+        )
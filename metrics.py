@@ -0,0 +1,194 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# ID of the request being handled, attached to every structured log line
+trace_id = contextvars.ContextVar('trace_id', default=None)
+
+# Where handled errors are counted: the request's route, a job type or a background task
+error_source = contextvars.ContextVar('error_source', default=None)
+
+# Latency buckets in seconds, wide enough for long Claude analyses
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, [('le', _format_number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """Holds the process's metrics and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """Register collect(), called before each render to refresh gauges from live stats"""
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                log_error('metrics_collect_error', e)
+
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'http_requests_total', 'Requests handled, by route, method and status', ('route', 'method', 'status')
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route', ('route', 'method')
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    'upstream_request_duration_seconds', 'Duration of calls to YouTube and Claude', ('service', 'method')
+)
+UPSTREAM_ERRORS = REGISTRY.counter(
+    'upstream_errors_total', 'Failed calls to YouTube and Claude', ('service', 'method', 'error')
+)
+APP_ERRORS = REGISTRY.counter(
+    'app_errors_total', 'Errors while handling a request or running background work', ('route', 'error')
+)
+CLAUDE_TOKENS = REGISTRY.counter(
+    'claude_tokens_total', 'Claude tokens by kind: input, output, cache_read, cache_creation', ('kind',)
+)
+YOUTUBE_QUOTA = REGISTRY.counter(
+    'youtube_quota_units_total', 'YouTube Data API quota units charged', ('method', 'feature')
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    'cache_lookups_total', 'Cache lookups, by cache and result', ('cache', 'result')
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    'cache_hit_ratio', 'Share of lookups served from cache, or of prompt tokens read from cache', ('cache',)
+)
+
+
+@contextmanager
+def upstream_timer(service, method):
+    """Time a call to an upstream service, counting it as an error if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        UPSTREAM_ERRORS.inc(service=service, method=method, error=type(e).__name__)
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, service=service, method=method)
+
+
+def log_event(event, **fields):
+    """Write one JSON log line tagged with the current trace ID"""
+    record = {'ts': round(time.time(), 3), 'event': event, 'trace_id': trace_id.get()}
+    record.update(fields)
+    print(json.dumps(record, default=str), flush=True)
+
+
+def log_error(event, error, **fields):
+    """Log an error that is handled rather than raised and count it in app_errors_total"""
+    APP_ERRORS.inc(route=error_source.get() or 'background', error=type(error).__name__)
+    log_event(event, error=str(error), error_type=type(error).__name__, **fields)
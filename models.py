@@ -31,12 +31,76 @@ class Analysis(db.Model):
     
     user = db.relationship('User', backref=db.backref('analyses', lazy=True))
     
-    def to_dict(self):
-        return {
+    # Serves the per-user, newest-first listing in /api/analyses
+    __table_args__ = (
+        db.Index('ix_analysis_user_created', 'user_id', 'created_at'),
+    )
+    
+    FIELDS = ('id', 'type', 'video_id', 'instruction', 'content', 'created_at')
+    
+    def to_dict(self, fields=None):
+        data = {
             'id': self.id,
             'type': self.type,
             'video_id': self.video_id,
             'instruction': self.instruction,
-            'content': self.content,
             'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+        }
+        if fields is None or 'content' in fields:
+            data['content'] = self.content
+        if fields is not None:
+            data = {key: value for key, value in data.items() if key in fields}
+        return data
+
+class CachedResult(db.Model):
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of inputs, instruction, model and max_tokens
+    kind = db.Column(db.String(20), nullable=False)
+    model = db.Column(db.String(64), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    type = db.Column(db.String(20), nullable=False)  # 'video', 'comments', 'channel', 'transcript' or 'crawl'
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'done' or 'failed'
+    params = db.Column(db.Text, nullable=False)  # JSON request body
+    result = db.Column(db.Text)  # JSON result once done
+    error = db.Column(db.Text)
+    analysis_id = db.Column(db.Integer, db.ForeignKey('analysis.id'))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'error': self.error,
+            'analysis_id': self.analysis_id,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class TrackedItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'video' or 'channel'
+    item_id = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # One registration per user and item; the tracker polls each item once however many users track it
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'kind', 'item_id', name='uq_tracked_user_item'),
+        db.Index('ix_tracked_kind_item', 'kind', 'item_id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'item_id': self.item_id,
+            'created_at': self.created_at.isoformat()
+        }
@@ -0,0 +1,144 @@
+import os
+
+# Context window of the Claude models used here, in tokens
+CONTEXT_TOKENS = 200000
+
+# Fields sent to Claude for each kind of item, in display order. Anything else
+# (thumbnails, playlist and comment IDs, author names) is left out of prompts.
+FIELDS = {
+    'video': ('title', 'channel', 'published_at', 'duration', 'view_count', 'like_count',
+              'comment_count', 'tags', 'description'),
+    'compare': ('title', 'channel', 'published_at', 'duration', 'view_count', 'like_count',
+                'comment_count', 'tags'),
+    'channel': ('title', 'created_at', 'subscriber_count', 'video_count', 'view_count', 'description'),
+    'channel_video': ('title', 'published_at', 'view_count', 'like_count', 'comment_count'),
+    'comment': ('theme', 'text', 'like_count', 'copies', 'published_at')
+}
+
+# Longest value, in characters, kept for free-text fields
+TEXT_LIMITS = {
+    'description': 1000,
+    'text': 1500
+}
+
+DATE_FIELDS = ('published_at', 'created_at')
+MAX_TAGS = 8
+
+# Anthropic only caches prompt prefixes of at least this many tokens
+CACHE_MIN_TOKENS = 1024
+PROMPT_CACHING_BETA = 'prompt-caching-2024-07-31'
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting prompts (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def prompt_budget(max_output_tokens=0):
+    """Input token budget for one prompt: CLAUDE_PROMPT_TOKENS, but never more than
+    the context window leaves room for after the response"""
+    budget = int(os.environ.get('CLAUDE_PROMPT_TOKENS', 30000))
+    return min(budget, CONTEXT_TOKENS - max_output_tokens)
+
+
+def truncate(text, limit):
+    """Collapse whitespace and cut text to at most limit characters at a word boundary"""
+    text = " ".join(str(text).split())
+    if limit is None or len(text) <= limit:
+        return text
+    if limit <= 0:
+        return ""
+    return text[:limit].rsplit(' ', 1)[0] + "..."
+
+
+def compact_value(key, value, limit=None):
+    if key in DATE_FIELDS:
+        return str(value)[:10]
+    if key == 'tags':
+        return ", ".join(value[:MAX_TAGS])
+    if key in TEXT_LIMITS:
+        return truncate(value, limit if limit is not None else TEXT_LIMITS[key])
+    return str(value)
+
+
+def serialize(item, fields, skip=(), limits=None, sep=" | "):
+    """Render the allowlisted fields of item as 'key: value' pairs joined by sep,
+    one line by default. limits overrides TEXT_LIMITS per field; empty values
+    are left out."""
+    limits = limits or {}
+    parts = []
+    for key in fields:
+        value = item.get(key)
+        if key in skip or value in (None, '', []):
+            continue
+        value = compact_value(key, value, limits.get(key))
+        if value:
+            parts.append(f"{key}: {value}")
+    return sep.join(parts)
+
+
+def format_comment(i, comment):
+    marker = "(reply) " if comment.get('parent_id') else ""
+    return f"{i}. {marker}{serialize(comment, FIELDS['comment'])}\n"
+
+
+def sample_evenly(items, count):
+    """Pick count items spread evenly over the list, keeping their order"""
+    if count >= len(items):
+        return list(items)
+    if count <= 0:
+        return []
+    step = len(items) / count
+    return [items[int(i * step)] for i in range(count)]
+
+
+def fit_lines(lines, budget):
+    """Return the lines, or an even sample of them, whose total tokens fit budget"""
+    sizes = [estimate_tokens(line) for line in lines]
+    if sum(sizes) <= budget:
+        return list(lines)
+
+    count = max(int(len(lines) * budget / sum(sizes)), 0)
+    while count:
+        sample = sample_evenly(lines, count)
+        if sum(estimate_tokens(line) for line in sample) <= budget:
+            return sample
+        count = int(count * 0.9)
+    return []
+
+
+def fit_text_limit(fixed_tokens, count, budget, start):
+    """Largest per-item text limit, halving from start, for which count texts of
+    that length fit in what budget leaves after fixed_tokens; 0 if none do"""
+    limit = start
+    while limit >= 40:
+        if fixed_tokens + estimate_tokens("x" * limit) * count <= budget:
+            return limit
+        limit //= 2
+    return 0
+
+
+def cacheable_message(data, instruction):
+    """
+    Content blocks for a prompt that puts the data first and the instruction after
+    it. A large data block is marked as a cache breakpoint, so other instructions
+    about the same data reuse the cached prefix instead of paying for it again.
+    """
+    block = {'type': 'text', 'text': data}
+    if estimate_tokens(data) >= CACHE_MIN_TOKENS:
+        block['cache_control'] = {'type': 'ephemeral'}
+    return [block, {'type': 'text', 'text': instruction}]
+
+
+def message_text(message):
+    """The text of a prompt given either as a string or as content blocks"""
+    if isinstance(message, str):
+        return message
+    return "\n\n".join(block['text'] for block in message)
+
+
+def check_prompt(message, max_output_tokens):
+    """Raise ValueError when a prompt would overflow the model's context window"""
+    tokens = estimate_tokens(message_text(message))
+    if tokens + max_output_tokens > CONTEXT_TOKENS:
+        raise ValueError(f"Prompt of about {tokens} tokens does not fit the model's context window")
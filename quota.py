@@ -0,0 +1,184 @@
+import asyncio
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
+from metrics import YOUTUBE_QUOTA
+from youtube_store import QuotaStore
+
+# Data API quota units charged per list call of each resource
+QUOTA_COSTS = {
+    'search': 100,
+    'videos': 1,
+    'channels': 1,
+    'commentThreads': 1,
+    'comments': 1,
+    'playlistItems': 1,
+}
+
+# The daily quota resets at midnight Pacific time
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+QUOTA_REASONS = {'quotaExceeded', 'dailyLimitExceeded'}
+
+# Which feature is spending quota; the app sets this to the route handling the request
+quota_feature = contextvars.ContextVar('quota_feature', default=None)
+
+
+class QuotaExceededError(Exception):
+    """Raised when the daily YouTube Data API budget is used up"""
+
+
+def error_reason(error):
+    """Return the 'reason' of a Data API HttpError, e.g. 'quotaExceeded'"""
+    try:
+        details = json.loads(error.content)['error']['errors']
+        return details[0].get('reason')
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+class QuotaScheduler:
+    """
+    Charges every Data API call attempt to a per-day quota budget kept in a
+    QuotaStore shared by all processes, spaces calls with a token bucket and
+    retries rate-limit, server and transient transport errors with exponential
+    backoff and full jitter.
+    """
+
+    def __init__(self, daily_budget=10000, rate=10.0, burst=20, max_retries=4, base_delay=0.5, max_delay=16.0,
+                 store=None):
+        self.daily_budget = daily_budget
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.store = store if store is not None else QuotaStore()
+
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self.retries = 0
+
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a scheduler from the YOUTUBE_* quota environment variables"""
+        return cls(
+            daily_budget=int(os.environ.get('YOUTUBE_DAILY_QUOTA', 10000)),
+            rate=float(os.environ.get('YOUTUBE_RATE_LIMIT', 10)),
+            burst=int(os.environ.get('YOUTUBE_RATE_BURST', 20))
+        )
+
+    @staticmethod
+    def _today():
+        return datetime.now(QUOTA_TIMEZONE).date()
+
+    def charge(self, resource):
+        """Charge one call of resource to today's budget, or raise QuotaExceededError"""
+        cost = QUOTA_COSTS.get(resource, 1)
+        feature = quota_feature.get() or 'other'
+        used, charged = self.store.charge(self._today().isoformat(), resource, feature, cost, self.daily_budget)
+        if not charged:
+            raise QuotaExceededError(
+                f"YouTube API quota exhausted: {used} of {self.daily_budget} units used today"
+            )
+        YOUTUBE_QUOTA.inc(cost, method=resource, feature=feature)
+        return cost
+
+    def wait_time(self):
+        """Take a token from the bucket and return how long to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def backoff(self, attempt):
+        """Delay before retry number attempt (0-based): full jitter over an exponential cap"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def is_retryable(self, status, reason):
+        return status in RETRY_STATUSES or (status == 403 and reason in RATE_LIMIT_REASONS)
+
+    def mark_exhausted(self):
+        """Record that YouTube itself reported the daily quota as used up"""
+        self.store.mark_exhausted(self._today().isoformat())
+
+    def _should_retry(self, error, attempt):
+        # Errors other than HttpError are transient transport errors, such as timeouts
+        reason = error_reason(error) if isinstance(error, HttpError) else None
+        if reason in QUOTA_REASONS:
+            self.mark_exhausted()
+            raise QuotaExceededError("YouTube API quota exhausted for today") from error
+
+        if attempt == self.max_retries:
+            return False
+        if isinstance(error, HttpError) and not self.is_retryable(error.resp.status, reason):
+            return False
+
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def execute(self, resource, call, transient=()):
+        """Run call() for a list request on resource under the budget and rate limit.
+        Exceptions of the transient types, such as connection errors, are retried too."""
+        for attempt in range(self.max_retries + 1):
+            delay = self.wait_time()
+            if delay:
+                time.sleep(delay)
+
+            # YouTube bills every attempt, retries included
+            self.charge(resource)
+            try:
+                return call()
+            except (HttpError, *transient) as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self.backoff(attempt))
+
+    async def execute_async(self, resource, call, transient=()):
+        """Like execute, for a coroutine function call, sleeping without blocking the event loop"""
+        for attempt in range(self.max_retries + 1):
+            delay = self.wait_time()
+            if delay:
+                await asyncio.sleep(delay)
+
+            # YouTube bills every attempt, retries included; the store is on local disk
+            await asyncio.to_thread(self.charge, resource)
+            try:
+                return await call()
+            except (HttpError, *transient) as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+
+    def status(self):
+        day = self._today()
+        used, exhausted, by_method, by_feature = self.store.usage(day.isoformat())
+        tomorrow = datetime.combine(day + timedelta(days=1), datetime.min.time(), QUOTA_TIMEZONE)
+        with self._lock:
+            retries = self.retries
+        return {
+            'day': day.isoformat(),
+            'budget': self.daily_budget,
+            'used': used,
+            'remaining': 0 if exhausted else max(self.daily_budget - used, 0),
+            'exhausted': exhausted,
+            'resets_at': tomorrow.isoformat(),
+            'retries': retries,
+            'by_method': by_method,
+            'by_feature': by_feature
+        }
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from metrics import CACHE_LOOKUPS
+from models import db, CachedResult
+
+# Seconds a cached analysis stays valid per analysis kind. Keys cover the
+# content of the payload but not its live counters, so the TTL bounds how long
+# an answer quoting older view, like or subscriber counts can be served.
+DEFAULT_TTLS = {
+    'video': 6 * 3600,
+    'videos': 6 * 3600,
+    'comments': 3600,
+    'channel': 6 * 3600,
+    'transcript': 30 * 24 * 3600,
+}
+
+# Counters that change between otherwise identical YouTube responses
+COUNTER_FIELDS = frozenset({'view_count', 'like_count', 'comment_count', 'subscriber_count', 'video_count'})
+
+
+def normalize_instruction(instruction):
+    """Lowercase and collapse whitespace so trivially different instructions share results"""
+    return ' '.join(instruction.lower().split())
+
+
+def without_counters(value):
+    """value with the COUNTER_FIELDS of every nested dict left out"""
+    if isinstance(value, dict):
+        return {key: without_counters(item) for key, item in value.items() if key not in COUNTER_FIELDS}
+    if isinstance(value, (list, tuple)):
+        return [without_counters(item) for item in value]
+    return value
+
+
+class ResultKey:
+    """Incremental sha256 over the inputs of an analysis, fed one part at a time"""
+
+    def __init__(self, kind, instruction, model, max_tokens):
+        self._hash = hashlib.sha256()
+        self.update([kind, normalize_instruction(instruction), model, max_tokens])
+
+    def update(self, value):
+        serialized = json.dumps(without_counters(value), sort_keys=True, separators=(',', ':'), default=str)
+        self._hash.update(serialized.encode('utf-8') + b'\n')
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class ResultCache:
+    """Stores Claude analysis results in the app database, keyed on a hash of the prompt inputs"""
+
+    def __init__(self, ttls=None):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_key(kind, instruction, model, max_tokens):
+        """A ResultKey to feed the payload to part by part"""
+        return ResultKey(kind, instruction, model, max_tokens)
+
+    @staticmethod
+    def make_key(kind, payload, instruction, model, max_tokens):
+        key = ResultKey(kind, instruction, model, max_tokens)
+        key.update(payload)
+        return key.hexdigest()
+
+    def get(self, key):
+        entry = CachedResult.query.get(key)
+        if entry is not None and entry.expires_at < datetime.utcnow():
+            db.session.delete(entry)
+            db.session.commit()
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_LOOKUPS.inc(cache='analysis', result='miss' if entry is None else 'hit')
+
+        return entry.content if entry is not None else None
+
+    def set(self, key, kind, model, content):
+        now = datetime.utcnow()
+        ttl = self.ttls.get(kind, 3600)
+
+        db.session.merge(CachedResult(
+            key=key,
+            kind=kind,
+            model=model,
+            content=content,
+            created_at=now,
+            expires_at=now + timedelta(seconds=ttl)
+        ))
+        CachedResult.query.filter(CachedResult.expires_at < now).delete()
+        db.session.commit()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'entries': CachedResult.query.count()
+        }
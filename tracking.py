@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+from collections import deque
+try:
+    import fcntl
+except ImportError:  # Windows: a single development server needs no lock
+    fcntl = None
+from googleapiclient.errors import HttpError
+from metrics import error_source, log_error, log_event
+from models import db, TrackedItem
+from quota import QUOTA_COSTS, QuotaExceededError, quota_feature
+from youtube_client import VIDEO_BATCH_SIZE
+
+# Tracked kinds and the Data API resource that reports their statistics
+TRACKED_KINDS = {'video': 'videos', 'channel': 'channels'}
+
+# Windows reported by growth_rates, in seconds
+GROWTH_WINDOWS = {'1h': 3600, '24h': 86400, '7d': 7 * 86400, '30d': 30 * 86400}
+
+# Items YouTube stops returning (deleted, private) are retried after doubling
+# waits, up to this many seconds
+MAX_MISS_BACKOFF = 7 * 86400
+
+
+def snapshot_row(kind, item_id, statistics, taken_at):
+    """A StatsStore row from the statistics part of a videos or channels resource"""
+    def count(key):
+        value = statistics.get(key)
+        return int(value) if value is not None else None
+
+    if kind == 'video':
+        return (item_id, taken_at, count('viewCount'), count('likeCount'), count('commentCount'), None, None)
+    # subscriberCount is missing when the channel hides it
+    return (item_id, taken_at, count('viewCount'), None, None, count('subscriberCount'), count('videoCount'))
+
+
+def growth_rates(store, item_id, now=None, windows=GROWTH_WINDOWS):
+    """
+    Change of each count over each window, measured from the last snapshot
+    before the window (or the first one inside it) to the latest snapshot.
+    Rates are per hour; windows without two snapshots are left out.
+    """
+    now = int(now if now is not None else time.time())
+    latest = store.latest(item_id, before=now)
+    if latest is None:
+        return {}
+
+    growth = {}
+    for name, seconds in windows.items():
+        start = store.latest(item_id, before=now - seconds) or store.earliest(item_id, since=now - seconds)
+        if start is None or start['taken_at'] >= latest['taken_at']:
+            continue
+
+        hours = (latest['taken_at'] - start['taken_at']) / 3600
+        window = {'from': start['taken_at'], 'to': latest['taken_at'], 'hours': round(hours, 2)}
+        for key in store.COUNTS:
+            if key in start and key in latest:
+                change = latest[key] - start[key]
+                window[key] = {
+                    'change': change,
+                    'per_hour': round(change / hours, 2),
+                    'percent': round(100 * change / start[key], 3) if start[key] else None
+                }
+        growth[name] = window
+    return growth
+
+
+class StatsTracker:
+    """
+    Polls statistics of every tracked video and channel into a StatsStore on a
+    background thread. Each item is polled once per interval however many users
+    track it, 50 IDs per videos.list or channels.list call, oldest snapshot
+    first, and the calls made in any interval are capped at quota_per_interval
+    units so tracking cannot eat the budget of interactive requests. Only one
+    process polls: every server process starts a tracker, and the one holding
+    the lock file does the work.
+    """
+
+    def __init__(self, app, youtube_client, store, interval=3600, quota_per_interval=100, check_every=60,
+                 lock_path=None):
+        self.app = app
+        self.youtube_client = youtube_client
+        self.store = store
+        self.interval = interval
+        self.quota_per_interval = quota_per_interval
+        self.check_every = check_every
+        self.lock_path = lock_path or store.path + '.tracker.lock'
+
+        self._spent = deque()  # (time, units) of polls within the last interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+    @classmethod
+    def from_env(cls, app, youtube_client, store):
+        """Build a tracker from the TRACKING_* environment variables"""
+        return cls(
+            app, youtube_client, store,
+            interval=int(os.environ.get('TRACKING_INTERVAL_SECONDS', 3600)),
+            quota_per_interval=int(os.environ.get('TRACKING_QUOTA_PER_INTERVAL', 100)),
+            check_every=int(os.environ.get('TRACKING_CHECK_SECONDS', 60)),
+            lock_path=os.environ.get('TRACKING_LOCK_PATH')
+        )
+
+    def start(self):
+        """Start polling in the background; an interval of 0 disables tracking"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='stats-tracker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.check_every):
+            try:
+                # Another process may hold the lock; try again next check
+                if self._acquire_lock():
+                    self.run_once()
+            except Exception as e:
+                log_error('tracking_error', e)
+
+    def _acquire_lock(self):
+        """Take the tracker lock file for the life of this process; False if another process has it"""
+        if self._lock_file is not None or fcntl is None:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        log_event('tracking_lock_acquired', pid=os.getpid())
+        return True
+
+    def _budget_left(self, now):
+        while self._spent and self._spent[0][0] <= now - self.interval:
+            self._spent.popleft()
+        return self.quota_per_interval - sum(units for _, units in self._spent)
+
+    def snapshot(self, kind, item_ids, now=None):
+        """Poll the statistics of item_ids now and store them; returns the IDs YouTube found"""
+        resource = TRACKED_KINDS[kind]
+        taken_at = int(now if now is not None else time.time())
+        found = set()
+        for i in range(0, len(item_ids), VIDEO_BATCH_SIZE):
+            statistics = self.youtube_client.get_statistics(resource, item_ids[i:i + VIDEO_BATCH_SIZE])
+            self.store.append([snapshot_row(kind, item_id, stats, taken_at) for item_id, stats in statistics.items()])
+            found.update(statistics)
+
+        self.store.record_misses([item_id for item_id in item_ids if item_id not in found], taken_at)
+        self.store.clear_misses(found)
+        return found
+
+    def due(self, now):
+        """
+        (kind, item_id) of tracked items not polled within the interval, oldest
+        first. Items the last polls did not find wait twice as long after each miss.
+        """
+        with self.app.app_context():
+            tracked = db.session.query(TrackedItem.kind, TrackedItem.item_id).distinct().all()
+
+        item_ids = [item_id for _, item_id in tracked]
+        last = self.store.last_taken(item_ids)
+        misses = self.store.misses(item_ids)
+
+        due = []
+        for kind, item_id in tracked:
+            tried_at, wait = last.get(item_id, 0), self.interval
+            if item_id in misses:
+                missed_at, count = misses[item_id]
+                tried_at = max(tried_at, missed_at)
+                wait = min(self.interval * 2 ** count, max(self.interval, MAX_MISS_BACKOFF))
+            # Allow one check period of slack so hourly polls do not drift later each run
+            if tried_at <= now - wait + self.check_every:
+                due.append((tried_at, kind, item_id))
+        return [(kind, item_id) for _, kind, item_id in sorted(due)]
+
+    def run_once(self, now=None):
+        """Poll the items that are due, within what is left of this interval's quota"""
+        quota_feature.set('tracking')
+        error_source.set('tracking')
+        now = int(now if now is not None else time.time())
+        due = self.due(now)
+
+        polled = missing = calls = attempted = 0
+        try:
+            for kind, resource in TRACKED_KINDS.items():
+                item_ids = [item_id for item_kind, item_id in due if item_kind == kind]
+                cost = QUOTA_COSTS.get(resource, 1)
+                for i in range(0, len(item_ids), VIDEO_BATCH_SIZE):
+                    if self._budget_left(now) < cost:
+                        break
+                    batch = item_ids[i:i + VIDEO_BATCH_SIZE]
+                    self._spent.append((now, cost))
+                    calls += 1
+                    attempted += len(batch)
+                    try:
+                        found = self.snapshot(kind, batch, now=now)
+                    except HttpError as e:
+                        log_error('youtube_error', e, resource=resource, status=e.resp.status)
+                        continue
+                    polled += len(found)
+                    missing += len(batch) - len(found)
+        except QuotaExceededError as e:
+            log_error('tracking_stopped', e)
+
+        summary = {
+            'due': len(due), 'polled': polled, 'missing': missing, 'calls': calls, 'deferred': len(due) - attempted
+        }
+        if due:
+            log_event('tracking_run', **summary)
+        return summary
@@ -0,0 +1,74 @@
+from prompts import estimate_tokens
+
+# How often an inline [m:ss] marker is written into window text, so Claude can
+# cite where in the video each point comes from
+MARKER_INTERVAL = 30
+
+
+def format_timestamp(seconds):
+    """Format seconds as m:ss, or h:mm:ss for long videos"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_range(start, end):
+    return f"{format_timestamp(start)}-{format_timestamp(end)}"
+
+
+def _segment_end(segment):
+    return segment['start'] + segment.get('duration', 0)
+
+
+def split_transcript(segments, max_tokens=4000, overlap_seconds=30):
+    """
+    Group timed transcript segments (as returned by YouTubeTranscriptApi) into
+    windows of about max_tokens tokens. Each window starts overlap_seconds before
+    the previous one ended, so a thought cut at a boundary appears whole in at
+    least one window. Returns a list of {'start', 'end', 'range', 'text'} dicts.
+    """
+    windows = []
+    i = 0
+
+    while i < len(segments):
+        parts = []
+        tokens = 0
+        last_marker = None
+        j = i
+
+        while j < len(segments):
+            segment = segments[j]
+            text = segment['text'].replace('\n', ' ').strip()
+            if last_marker is None or segment['start'] - last_marker >= MARKER_INTERVAL:
+                text = f"[{format_timestamp(segment['start'])}] {text}"
+                last_marker = segment['start']
+
+            size = estimate_tokens(text)
+            if parts and tokens + size > max_tokens:
+                break
+            parts.append(text)
+            tokens += size
+            j += 1
+
+        start = segments[i]['start']
+        end = _segment_end(segments[j - 1])
+        windows.append({
+            'start': start,
+            'end': end,
+            'range': format_range(start, end),
+            'text': ' '.join(parts)
+        })
+
+        if j >= len(segments):
+            break
+
+        # Step back over the overlap, but always move forward at least one segment
+        next_i = j
+        while next_i - 1 > i and segments[next_i - 1]['start'] >= end - overlap_seconds:
+            next_i -= 1
+        i = next_i
+
+    return windows
@@ -0,0 +1,4 @@
+"""Entrypoint for production WSGI servers, e.g. gunicorn wsgi:app"""
+from app import app, start_background_work
+
+start_background_work()
@@ -1,13 +1,38 @@
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from cache import ResponseCache
+from metrics import log_error, upstream_timer
+from quota import QuotaScheduler
+from youtube_store import ChannelIndex, ChannelVideoStore, TranscriptStore
+import contextvars
+import httplib2
+import itertools
 import os
+import threading
+import time
 
 # Load environment variables
 load_dotenv()
 
+# videos.list accepts at most 50 comma-separated IDs per call
+VIDEO_BATCH_SIZE = 50
+
+# Largest page commentThreads.list and comments.list will return
+COMMENT_PAGE_SIZE = 100
+
+# Host serving the Data API; point it at a local stand-in server for benchmarks
+API_ENDPOINT = os.environ.get('YOUTUBE_API_ENDPOINT', 'https://www.googleapis.com/')
+
+# Largest page playlistItems.list will return
+PLAYLIST_PAGE_SIZE = 50
+
+# How long channel listings are served from the video store before checking for new uploads
+CHANNEL_REFRESH_SECONDS = int(os.environ.get('CHANNEL_REFRESH_SECONDS', 900))
+
 class YouTubeClient:
-    def __init__(self):
+    def __init__(self, cache=None, channel_index=None, transcript_store=None, scheduler=None, video_store=None):
         # Get API key from environment variables
         self.api_key = os.environ.get('YOUTUBE_API_KEY')
         if not self.api_key:
@@ -15,264 +40,530 @@ class YouTubeClient:
         
         print(f"Using YouTube API key from environment variables")
         self.max_results = 10
-        self.youtube = build('youtube', 'v3', developerKey=self.api_key)
+        self.max_workers = 8
+        self.youtube = build(
+            'youtube', 'v3',
+            developerKey=self.api_key,
+            client_options={'api_endpoint': API_ENDPOINT}
+        )
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self.channel_index = channel_index if channel_index is not None else ChannelIndex()
+        self.transcript_store = transcript_store if transcript_store is not None else TranscriptStore()
+        self.scheduler = scheduler if scheduler is not None else QuotaScheduler.from_env()
+        self.video_store = video_store if video_store is not None else ChannelVideoStore()
+        self._local = threading.local()
+
+    def _http(self):
+        # httplib2.Http is not thread-safe, so every thread executes requests on its own
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = httplib2.Http()
+            self._local.http = http
+        return http
+
+    def _list(self, resource, use_cache=True, **params):
+        """Run a Data API list call, serving repeated requests from the response cache.
+        Calls that reach the API are charged to the quota budget and retried on
+        transient errors by the scheduler. Pass use_cache=False when the result
+        must be current, as when crawling for new uploads."""
+        if use_cache:
+            cached = self.cache.get(resource, params)
+            if cached is not None:
+                return cached
+
+        request = getattr(self.youtube, resource)().list(**params)
+
+        def call():
+            with upstream_timer('youtube', resource):
+                return request.execute(http=self._http())
+
+        # Connection errors and timeouts are retried like server errors
+        response = self.scheduler.execute(
+            resource, call, transient=(httplib2.HttpLib2Error, ConnectionError, TimeoutError)
+        )
+        if use_cache:
+            self.cache.set(resource, params, response)
+        return response
     
-    def search_videos(self, query, max_results=None, order=None, video_duration=None, published_after=None, published_before=None):
+    @staticmethod
+    def _thumbnail_url(snippet):
+        thumbnails = snippet['thumbnails']
+        return thumbnails['high']['url'] if 'high' in thumbnails else thumbnails['default']['url']
+
+    @staticmethod
+    def _parse_search_video(item):
+        return {
+            'id': item['id']['videoId'],
+            'title': item['snippet']['title'],
+            'description': item['snippet']['description'],
+            'thumbnail': item['snippet']['thumbnails']['high']['url'],
+            'channel': item['snippet']['channelTitle'],
+            'published_at': item['snippet']['publishedAt']
+        }
+
+    @classmethod
+    def _parse_playlist_video(cls, item):
+        return {
+            'id': item['contentDetails']['videoId'],
+            'title': item['snippet']['title'],
+            'description': item['snippet']['description'],
+            'thumbnail': cls._thumbnail_url(item['snippet']),
+            'channel': item['snippet']['channelTitle'],
+            # snippet.publishedAt is when the video joined the playlist; private
+            # and deleted videos have no videoPublishedAt
+            'published_at': item['contentDetails'].get('videoPublishedAt') or item['snippet']['publishedAt']
+        }
+
+    @staticmethod
+    def _uploads_page_params(playlist_id, page_token):
+        params = {
+            'part': 'snippet,contentDetails',
+            'playlistId': playlist_id,
+            'maxResults': PLAYLIST_PAGE_SIZE
+        }
+        if page_token:
+            params['pageToken'] = page_token
+        return params
+
+    @staticmethod
+    def _parse_channel_item(item):
+        return {
+            'id': item['id'],
+            'title': item['snippet']['title'],
+            'description': item['snippet']['description'],
+            'created_at': item['snippet']['publishedAt'],
+            'thumbnail': item['snippet']['thumbnails']['high']['url'],
+            'subscriber_count': item['statistics'].get('subscriberCount'),
+            'video_count': item['statistics'].get('videoCount'),
+            'view_count': item['statistics'].get('viewCount'),
+            'playlist_id': item['contentDetails']['relatedPlaylists']['uploads']
+        }
+
+    @classmethod
+    def _parse_search_channel(cls, item):
+        return {
+            'id': item['id']['channelId'],
+            'title': item['snippet']['title'],
+            'description': item['snippet']['description'],
+            'thumbnail': cls._thumbnail_url(item['snippet']),
+            'published_at': item['snippet']['publishedAt']
+        }
+
+    @staticmethod
+    def _parse_video_item(item):
+        return {
+            'id': item['id'],
+            'title': item['snippet']['title'],
+            'description': item['snippet']['description'],
+            'published_at': item['snippet']['publishedAt'],
+            'channel': item['snippet']['channelTitle'],
+            'tags': item['snippet'].get('tags', []),
+            'category_id': item['snippet']['categoryId'],
+            'duration': item['contentDetails']['duration'],
+            # Counts the owner hides (likes, comments) are missing, not zero
+            'view_count': item['statistics'].get('viewCount'),
+            'like_count': item['statistics'].get('likeCount'),
+            'comment_count': item['statistics'].get('commentCount')
+        }
+
+    def _enrich_videos(self, videos):
+        """Merge statistics and content details into snippet-only video results"""
+        details = self.get_videos_details([video['id'] for video in videos])
+        details_by_id = {video['id']: video for video in details}
+
+        enriched = []
+        for video in videos:
+            video = dict(video)
+            video.update(details_by_id.get(video['id'], {}))
+            enriched.append(video)
+
+        return enriched
+
+    @staticmethod
+    def _video_search_params(query, max_results, order=None, video_duration=None, published_after=None, published_before=None):
+        # Build search parameters
+        search_params = {
+            'q': query,
+            'part': 'snippet',
+            'maxResults': max_results,
+            'type': 'video'
+        }
+        
+        # Add optional parameters if provided
+        if order and order != 'relevance':
+            search_params['order'] = order
+        
+        if video_duration:
+            search_params['videoDuration'] = video_duration
+        
+        if published_after:
+            search_params['publishedAfter'] = published_after
+        
+        if published_before:
+            search_params['publishedBefore'] = published_before
+        
+        return search_params
+
+    def search_videos(self, query, max_results=None, order=None, video_duration=None, published_after=None, published_before=None, enrich=False):
         """Search for videos matching the query with advanced filters"""
-        try:
-            if max_results is None:
-                max_results = self.max_results
-            
-            # Build search parameters
-            search_params = {
-                'q': query,
-                'part': 'snippet',
-                'maxResults': max_results,
-                'type': 'video'
-            }
-            
-            # Add optional parameters if provided
-            if order and order != 'relevance':
-                search_params['order'] = order
-            
-            if video_duration:
-                search_params['videoDuration'] = video_duration
-            
-            if published_after:
-                search_params['publishedAfter'] = published_after
-            
-            if published_before:
-                search_params['publishedBefore'] = published_before
-            
-            search_response = self.youtube.search().list(**search_params).execute()
-            
-            videos = []
-            for item in search_response.get('items', []):
-                video = {
-                    'id': item['id']['videoId'],
-                    'title': item['snippet']['title'],
-                    'description': item['snippet']['description'],
-                    'thumbnail': item['snippet']['thumbnails']['high']['url'],
-                    'channel': item['snippet']['channelTitle'],
-                    'published_at': item['snippet']['publishedAt']
-                }
-                videos.append(video)
-            
-            return videos
+        if max_results is None:
+            max_results = self.max_results
+        
+        search_params = self._video_search_params(
+            query, max_results, order, video_duration, published_after, published_before
+        )
+        
+        search_response = self._list('search', **search_params)
+        
+        videos = []
+        for item in search_response.get('items', []):
+            video = self._parse_search_video(item)
+            videos.append(video)
+        
+        if enrich:
+            videos = self._enrich_videos(videos)
+        
+        return videos
         
-        except HttpError as e:
-            print(f"An HTTP error {e.resp.status} occurred: {e.content}")
-            return []
-    
     def get_video_details(self, video_id):
         """Get detailed information about a specific video"""
-        try:
-            video_response = self.youtube.videos().list(
-                part='snippet,contentDetails,statistics',
-                id=video_id
-            ).execute()
-            
-            if not video_response.get('items'):
-                return None
-                
-            item = video_response['items'][0]
-            video_details = {
-                'id': item['id'],
-                'title': item['snippet']['title'],
-                'description': item['snippet']['description'],
-                'published_at': item['snippet']['publishedAt'],
-                'channel': item['snippet']['channelTitle'],
-                'tags': item['snippet'].get('tags', []),
-                'category_id': item['snippet']['categoryId'],
-                'duration': item['contentDetails']['duration'],
-                'view_count': item['statistics'].get('viewCount', 0),
-                'like_count': item['statistics'].get('likeCount', 0),
-                'comment_count': item['statistics'].get('commentCount', 0)
-            }
-            
-            return video_details
-            
-        except HttpError as e:
-            print(f"An HTTP error {e.resp.status} occurred: {e.content}")
+        video_response = self._list(
+            'videos',
+            part='snippet,contentDetails,statistics',
+            id=video_id
+        )
+        
+        if not video_response.get('items'):
             return None
-    
+        
+        return self._parse_video_item(video_response['items'][0])
+
+    def get_videos_details(self, video_ids):
+        """Get detailed information for many videos, batching 50 IDs per request.
+        Results keep the input order; IDs that are not found are left out."""
+        unique_ids = list(dict.fromkeys(video_ids))
+        if not unique_ids:
+            return []
+
+        chunks = [unique_ids[i:i + VIDEO_BATCH_SIZE] for i in range(0, len(unique_ids), VIDEO_BATCH_SIZE)]
+
+        if len(chunks) == 1:
+            results = [self._get_videos_chunk(chunks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(chunks), self.max_workers)) as executor:
+                # Copy the caller's context so quota stays attributed to the calling feature
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self._get_videos_chunk, chunk)
+                    for chunk in chunks
+                ]
+                results = [future.result() for future in futures]
+
+        details_by_id = {}
+        for chunk_details in results:
+            details_by_id.update(chunk_details)
+
+        return [details_by_id[video_id] for video_id in video_ids if video_id in details_by_id]
+
+    def _get_videos_chunk(self, video_ids):
+        video_response = self._list(
+            'videos',
+            part='snippet,contentDetails,statistics',
+            id=','.join(video_ids)
+        )
+        return {item['id']: self._parse_video_item(item) for item in video_response.get('items', [])}
+
+    def get_statistics(self, resource, ids):
+        """
+        Current statistics of up to VIDEO_BATCH_SIZE videos or channels in one
+        call; resource is 'videos' or 'channels'. Only the statistics part is
+        requested and the response cache is skipped, so counts are current.
+        Returns {id: statistics}; IDs that are not found are left out.
+        """
+        response = self._list(resource, use_cache=False, part='statistics', id=','.join(ids))
+        return {item['id']: item.get('statistics', {}) for item in response.get('items', [])}
+
     def get_video_comments(self, video_id, max_results=None, page_token=None):
         """Get comments for a specific video with pagination support"""
-        try:
-            if max_results is None:
-                max_results = self.max_results
-            
+        if max_results is None:
+            max_results = self.max_results
+        
+        params = {
+            'part': 'snippet',
+            'videoId': video_id,
+            'maxResults': max_results,
+            'textFormat': 'plainText'
+        }
+        
+        if page_token:
+            params['pageToken'] = page_token
+        
+        comments_response = self._list('commentThreads', **params)
+        
+        comments = []
+        for item in comments_response.get('items', []):
+            comment = self._parse_comment(item['id'], item['snippet']['topLevelComment']['snippet'])
+            comments.append(comment)
+        
+        next_page_token = comments_response.get('nextPageToken')
+        
+        return comments, next_page_token
+
+    @staticmethod
+    def _parse_comment(comment_id, snippet):
+        return {
+            'id': comment_id,
+            'text': snippet['textDisplay'],
+            'author': snippet['authorDisplayName'],
+            'published_at': snippet['publishedAt'],
+            'like_count': snippet['likeCount']
+        }
+
+    def iter_video_comments(self, video_id, max_comments=None, time_budget=None, include_replies=False, order=None):
+        """Yield comments for a video as each page arrives, following nextPageToken.
+
+        Stops after max_comments comments or once time_budget seconds have passed.
+        With include_replies, each thread's replies follow their top-level comment
+        and carry a 'parent_id'.
+        """
+        deadline = time.monotonic() + time_budget if time_budget else None
+        remaining = max_comments
+        page_token = None
+
+        while True:
             params = {
-                'part': 'snippet',
+                'part': 'snippet,replies' if include_replies else 'snippet',
                 'videoId': video_id,
-                'maxResults': max_results,
+                'maxResults': COMMENT_PAGE_SIZE,
                 'textFormat': 'plainText'
             }
-        
+            if order:
+                params['order'] = order
             if page_token:
                 params['pageToken'] = page_token
-            
-            comments_response = self.youtube.commentThreads().list(**params).execute()
-        
-            comments = []
+
+            try:
+                comments_response = self._list('commentThreads', **params)
+            except HttpError as e:
+                if not page_token:
+                    raise
+                # Keep the comments harvested so far
+                log_error('youtube_error', e, resource='commentThreads', status=e.resp.status)
+                return
+
             for item in comments_response.get('items', []):
-                comment = {
-                    'id': item['id'],
-                    'text': item['snippet']['topLevelComment']['snippet']['textDisplay'],
-                    'author': item['snippet']['topLevelComment']['snippet']['authorDisplayName'],
-                    'published_at': item['snippet']['topLevelComment']['snippet']['publishedAt'],
-                    'like_count': item['snippet']['topLevelComment']['snippet']['likeCount']
-                }
-                comments.append(comment)
-        
-            next_page_token = comments_response.get('nextPageToken')
-        
-            return comments, next_page_token
-        
-        except HttpError as e:
-            print(f"An HTTP error {e.resp.status} occurred: {e.content}")
-            return [], None
+                page = [self._parse_comment(item['id'], item['snippet']['topLevelComment']['snippet'])]
+                if include_replies:
+                    page = itertools.chain(page, self._iter_comment_replies(item, deadline))
+
+                for comment in page:
+                    yield comment
+                    if remaining is not None:
+                        remaining -= 1
+                        if remaining <= 0:
+                            return
+
+            page_token = comments_response.get('nextPageToken')
+            if not page_token or (deadline and time.monotonic() >= deadline):
+                return
+
+    def _iter_comment_replies(self, thread, deadline=None):
+        """Yield the replies of a comment thread, paging through comments.list when
+        the thread has more replies than commentThreads.list returns inline"""
+        inline_replies = thread.get('replies', {}).get('comments', [])
+        total_replies = thread['snippet'].get('totalReplyCount', 0)
+
+        if len(inline_replies) >= total_replies:
+            for reply in inline_replies:
+                comment = self._parse_comment(reply['id'], reply['snippet'])
+                comment['parent_id'] = thread['id']
+                yield comment
+            return
+
+        page_token = None
+        while True:
+            params = {
+                'part': 'snippet',
+                'parentId': thread['id'],
+                'maxResults': COMMENT_PAGE_SIZE,
+                'textFormat': 'plainText'
+            }
+            if page_token:
+                params['pageToken'] = page_token
+
+            try:
+                replies_response = self._list('comments', **params)
+            except HttpError as e:
+                log_error('youtube_error', e, resource='comments', status=e.resp.status)
+                return
+
+            for reply in replies_response.get('items', []):
+                comment = self._parse_comment(reply['id'], reply['snippet'])
+                comment['parent_id'] = thread['id']
+                yield comment
+
+            page_token = replies_response.get('nextPageToken')
+            if not page_token or (deadline and time.monotonic() >= deadline):
+                return
+
+    def get_transcript_segments(self, video_id, language='en'):
+        """
+        Get the timed transcript segments ({'text', 'start', 'duration'}) for a video.
+        Returns (segments, note): the note gives the language when the transcript is
+        not an original in the requested language, or explains why no segments could
+        be fetched. Transcripts are downloaded once and then served from the local store.
+        """
+        stored = self.transcript_store.get_segments(video_id, language)
+        if stored is not None:
+            return stored
 
-    def get_video_transcript(self, video_id):
-        """Get transcript for a specific video using YouTube Transcript API"""
         try:
-            from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
+            with upstream_timer('youtube', 'transcript'):
+                segments, note = self._fetch_transcript_segments(video_id, language)
+        except Exception as e:
+            log_error('transcript_error', e, video_id=video_id)
+            return [], f"Error retrieving transcript: {str(e)}"
+        if segments:
+            self.transcript_store.put(video_id, language, segments, note)
+        return segments, note
+
+    def _fetch_transcript_segments(self, video_id, language):
+        """Download a transcript using YouTube Transcript API; unexpected errors are raised"""
+        from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
 
+        try:
+            # First try to get a transcript in the requested language
+            return YouTubeTranscriptApi.get_transcript(video_id, languages=[language]), ""
+        except NoTranscriptFound:
+            # If there is none, try to get transcript in any language
             try:
-                # First try to get English transcript
-                transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
-                transcript_text = ""
-                for item in transcript_list:
-                    transcript_text += item['text'] + " "
-                return transcript_text
-            except NoTranscriptFound:
-                # If no English transcript, try to get transcript in any language
-                try:
-                    transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-                
-                    # Get the first available transcript
-                    for transcript in transcript_list:
-                        # Try to get either a manually created transcript or auto-generated one
-                        try:
-                            # Try to use an English translation if available
-                            if transcript.is_translatable:
-                                transcript = transcript.translate('en')
-                                translated = True
-                            else:
-                                translated = False
-                            
-                            fetched_transcript = transcript.fetch()
+                transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+            
+                # Get the first available transcript
+                for transcript in transcript_list:
+                    # Try to get either a manually created transcript or auto-generated one
+                    try:
+                        # Try to use a translation if available
+                        if transcript.is_translatable:
+                            transcript = transcript.translate(language)
+                            translated = True
+                        else:
+                            translated = False
+                        
+                        fetched_transcript = transcript.fetch()
                         
-                            transcript_text = ""
-                            for item in fetched_transcript:
-                                transcript_text += item['text'] + " "
-                            
-                            language_info = f" (Translated from {transcript.language_code})" if translated else f" (Original language: {transcript.language_code})"
-                            return transcript_text + language_info
-                        except Exception:
-                            continue
-                
-                    # If we got here, we couldn't get any transcript
-                    return "No usable transcript could be found for this video."
-                except Exception as e:
-                    return f"No transcript available: {str(e)}"
-            except TranscriptsDisabled:
-                return "Transcripts are disabled for this video."
+                        language_info = f" (Translated from {transcript.language_code})" if translated else f" (Original language: {transcript.language_code})"
+                        return fetched_transcript, language_info
+                    except Exception:
+                        continue
             
-        except Exception as e:
-            print(f"Error retrieving transcript: {e}")
-            return f"Error retrieving transcript: {str(e)}"
+                # If we got here, we couldn't get any transcript
+                return [], "No usable transcript could be found for this video."
+            except Exception as e:
+                return [], f"No transcript available: {str(e)}"
+        except TranscriptsDisabled:
+            return [], "Transcripts are disabled for this video."
+
+    def get_video_transcript(self, video_id, language='en'):
+        """Get transcript text for a specific video, from the local store when available"""
+        stored = self.transcript_store.get_text(video_id, language)
+        if stored is not None:
+            transcript_text, note = stored
+            return transcript_text + note
+
+        segments, note = self.get_transcript_segments(video_id, language)
+        if not segments:
+            return note
+        return TranscriptStore.join_segments(segments) + note
         
     def get_channel_details(self, channel_id):
         """Get detailed information about a specific channel"""
-        try:
-            channel_response = self.youtube.channels().list(
-                part='snippet,statistics,contentDetails',
-                id=channel_id
-            ).execute()
+        channel_response = self._list(
+            'channels',
+            part='snippet,statistics,contentDetails',
+            id=channel_id
+        )
         
-            if not channel_response.get('items'):
-                return None
-                
-            item = channel_response['items'][0]
-            channel_details = {
-                'id': item['id'],
-                'title': item['snippet']['title'],
-                'description': item['snippet']['description'],
-                'created_at': item['snippet']['publishedAt'],
-                'thumbnail': item['snippet']['thumbnails']['high']['url'],
-                'subscriber_count': item['statistics'].get('subscriberCount', 0),
-                'video_count': item['statistics'].get('videoCount', 0),
-                'view_count': item['statistics'].get('viewCount', 0),
-                'playlist_id': item['contentDetails']['relatedPlaylists']['uploads']
-            }
-        
-            return channel_details
-            
-        except HttpError as e:
-            print(f"An HTTP error {e.resp.status} occurred: {e.content}")
+        if not channel_response.get('items'):
             return None
         
-    def get_channel_videos(self, channel_id, max_results=10):
-        """Get videos from a specific channel"""
-        try:
-            # First get the channel's uploads playlist
-            channel = self.get_channel_details(channel_id)
-            if not channel:
-                return []
-        
-            playlist_id = channel['playlist_id']
-        
-            # Then get videos from that playlist
-            playlist_response = self.youtube.playlistItems().list(
-                part='snippet,contentDetails',
-                playlistId=playlist_id,
-                maxResults=max_results
-            ).execute()
+        item = channel_response['items'][0]
+        channel_details = self._parse_channel_item(item)
+        self.channel_index.set(channel_details['id'], channel_details['playlist_id'])
         
-            videos = []
-            for item in playlist_response.get('items', []):
-                video = {
-                    'id': item['contentDetails']['videoId'],
-                    'title': item['snippet']['title'],
-                    'description': item['snippet']['description'],
-                    'thumbnail': item['snippet']['thumbnails']['high']['url'] if 'high' in item['snippet']['thumbnails'] else item['snippet']['thumbnails']['default']['url'],
-                    'channel': item['snippet']['channelTitle'],
-                    'published_at': item['snippet']['publishedAt']
-                }
-                videos.append(video)
-        
-            return videos
+        return channel_details
         
+    def get_uploads_playlist_id(self, channel_id):
+        """Get the uploads playlist of a channel, calling channels.list only for unseen channels"""
+        playlist_id = self.channel_index.get(channel_id)
+        if playlist_id:
+            return playlist_id
+
+        channel = self.get_channel_details(channel_id)
+        return channel['playlist_id'] if channel else None
+
+    def crawl_channel_uploads(self, channel_id, playlist_id=None, max_pages=None, resume=True):
+        """
+        Walk a channel's uploads playlist into the local video store. The first
+        crawl pages back through every upload; later crawls stop at the newest
+        stored video, so they usually take a single request. An interrupted
+        backfill (max_pages reached) continues where it stopped unless resume is
+        False. Returns a summary dict, or None if the channel does not exist.
+        """
+        crawl = self.video_store.get_crawl(channel_id)
+        if playlist_id is None:
+            playlist_id = crawl['playlist_id'] if crawl else self.get_uploads_playlist_id(channel_id)
+            if not playlist_id:
+                return None
+
+        def fetch_page(page_token):
+            # Always ask YouTube, since a cached page would hide new uploads
+            response = self._list(
+                'playlistItems', use_cache=False, **self._uploads_page_params(playlist_id, page_token)
+            )
+            videos = [self._parse_playlist_video(item) for item in response.get('items', [])]
+            return videos, response.get('nextPageToken')
+
+        return self.video_store.crawl(channel_id, playlist_id, fetch_page, max_pages=max_pages, resume=resume)
+
+    def get_channel_videos(self, channel_id, max_results=10, enrich=False, playlist_id=None, offset=0):
+        """
+        Get a channel's videos, newest first, from the local video store. New
+        uploads are crawled first unless the channel was checked within
+        CHANNEL_REFRESH_SECONDS; a channel's first listing fetches one page.
+        Pass playlist_id when the uploads playlist is already known.
+        """
+        try:
+            crawl = self.video_store.get_crawl(channel_id)
+            if crawl is None or time.time() - crawl['crawled_at'] > CHANNEL_REFRESH_SECONDS:
+                self.crawl_channel_uploads(
+                    channel_id, playlist_id=playlist_id, max_pages=None if crawl else 1, resume=False
+                )
+
         except HttpError as e:
-            print(f"An HTTP error {e.resp.status} occurred: {e.content}")
-            return []    
-        
+            # Serve whatever is already stored
+            log_error('youtube_error', e, resource='playlistItems', status=e.resp.status)
+
+        videos = self.video_store.list_videos(channel_id, limit=max_results, offset=offset)
+
+        if enrich and videos:
+            videos = self._enrich_videos(videos)
+
+        return videos
+
     def search_channels(self, query, max_results=5):
         """Search for channels matching the query"""
-        try:
-            search_params = {
-                'q': query,
-                'part': 'snippet',
-                'maxResults': max_results,
-                'type': 'channel'
-            }
+        search_params = {
+            'q': query,
+            'part': 'snippet',
+            'maxResults': max_results,
+            'type': 'channel'
+        }
         
-            search_response = self.youtube.search().list(**search_params).execute()
+        search_response = self._list('search', **search_params)
         
-            channels = []
-            for item in search_response.get('items', []):
-                channel = {
-                    'id': item['id']['channelId'],
-                    'title': item['snippet']['title'],
-                    'description': item['snippet']['description'],
-                    'thumbnail': item['snippet']['thumbnails']['high']['url'] if 'high' in item['snippet']['thumbnails'] else item['snippet']['thumbnails']['default']['url'],
-                    'published_at': item['snippet']['publishedAt']
-                }
-                channels.append(channel)
+        channels = []
+        for item in search_response.get('items', []):
+            channel = self._parse_search_channel(item)
+            channels.append(channel)
         
-            return channels
-        
-        except HttpError as e:
-            print(f"An HTTP error {e.resp.status} occurred: {e.content}")
-            return []
\ No newline at end of file
+        return channels
\ No newline at end of file
@@ -0,0 +1,460 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class LocalStore:
+    """Base for the small SQLite stores that keep YouTube data on local disk"""
+
+    schema = ()
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('YOUTUBE_STORE_PATH', 'youtube_store.db')
+        self._local = threading.local()
+
+        conn = self._connection()
+        for statement in self.schema:
+            conn.execute(statement)
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+
+class ChannelIndex(LocalStore):
+    """Maps channel IDs to their uploads playlist so listings can skip channels.list"""
+
+    schema = (
+        'CREATE TABLE IF NOT EXISTS channel_uploads ('
+        ' channel_id TEXT PRIMARY KEY,'
+        ' playlist_id TEXT NOT NULL,'
+        ' updated_at REAL NOT NULL'
+        ') WITHOUT ROWID',
+    )
+
+    def __init__(self, path=None):
+        super().__init__(path)
+        # Uploads playlists never change, so lookups can stay in memory once seen
+        self._memo = {}
+
+    def get(self, channel_id):
+        playlist_id = self._memo.get(channel_id)
+        if playlist_id is not None:
+            return playlist_id
+
+        row = self._connection().execute(
+            'SELECT playlist_id FROM channel_uploads WHERE channel_id = ?', (channel_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        self._memo[channel_id] = row[0]
+        return row[0]
+
+    def set(self, channel_id, playlist_id):
+        if self._memo.get(channel_id) == playlist_id:
+            return
+
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO channel_uploads (channel_id, playlist_id, updated_at) VALUES (?, ?, ?)',
+            (channel_id, playlist_id, time.time())
+        )
+        conn.commit()
+        self._memo[channel_id] = playlist_id
+
+
+class TranscriptStore(LocalStore):
+    """
+    Keeps downloaded transcripts on disk, keyed by video ID and language. Timed
+    segments and the joined text are stored zlib-compressed in separate columns
+    so either can be read without decoding the other.
+    """
+
+    schema = (
+        'CREATE TABLE IF NOT EXISTS transcripts ('
+        ' video_id TEXT NOT NULL,'
+        ' language TEXT NOT NULL,'
+        ' note TEXT NOT NULL,'
+        ' segments BLOB NOT NULL,'
+        ' text BLOB NOT NULL,'
+        ' fetched_at REAL NOT NULL,'
+        ' PRIMARY KEY (video_id, language)'
+        ') WITHOUT ROWID',
+    )
+
+    @staticmethod
+    def join_segments(segments):
+        return " ".join(segment['text'] for segment in segments)
+
+    def get_segments(self, video_id, language):
+        """Return (segments, note) for a stored transcript, or None"""
+        row = self._connection().execute(
+            'SELECT segments, note FROM transcripts WHERE video_id = ? AND language = ?',
+            (video_id, language)
+        ).fetchone()
+        if row is None:
+            return None
+
+        # Stored as [start, duration, text] triples to keep the payload small
+        rows = json.loads(zlib.decompress(row[0]))
+        segments = [{'start': start, 'duration': duration, 'text': text} for start, duration, text in rows]
+        return segments, row[1]
+
+    def get_text(self, video_id, language):
+        """Return (text, note) for a stored transcript, or None"""
+        row = self._connection().execute(
+            'SELECT text, note FROM transcripts WHERE video_id = ? AND language = ?',
+            (video_id, language)
+        ).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode('utf-8'), row[1]
+
+    def put(self, video_id, language, segments, note=""):
+        rows = [
+            [round(segment['start'], 3), round(segment.get('duration', 0), 3), segment['text']]
+            for segment in segments
+        ]
+        packed_segments = zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'), 9)
+        packed_text = zlib.compress(self.join_segments(segments).encode('utf-8'), 9)
+
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO transcripts (video_id, language, note, segments, text, fetched_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (video_id, language, note, packed_segments, packed_text, time.time())
+        )
+        conn.commit()
+
+
+class ChannelVideoStore(LocalStore):
+    """
+    Uploads of crawled channels, with where each channel's crawl left off. The
+    uploads playlist lists newest videos first, so a crawl that meets a stored
+    video has caught up; a crawl that was cut short resumes from its page token.
+    """
+
+    schema = (
+        'CREATE TABLE IF NOT EXISTS channel_videos ('
+        ' channel_id TEXT NOT NULL,'
+        ' video_id TEXT NOT NULL,'
+        ' published_at TEXT NOT NULL,'
+        ' title TEXT NOT NULL,'
+        ' description TEXT NOT NULL,'
+        ' thumbnail TEXT,'
+        ' channel TEXT,'
+        ' PRIMARY KEY (channel_id, video_id)'
+        ') WITHOUT ROWID',
+        'CREATE INDEX IF NOT EXISTS ix_channel_videos_published ON channel_videos (channel_id, published_at DESC)',
+        'CREATE TABLE IF NOT EXISTS channel_crawls ('
+        ' channel_id TEXT PRIMARY KEY,'
+        ' playlist_id TEXT NOT NULL,'
+        ' resume_token TEXT,'
+        ' complete INTEGER NOT NULL DEFAULT 0,'
+        ' crawled_at REAL NOT NULL'
+        ') WITHOUT ROWID',
+    )
+
+    def get_crawl(self, channel_id):
+        """Return {'playlist_id', 'resume_token', 'complete', 'crawled_at'} for a crawled channel, or None"""
+        row = self._connection().execute(
+            'SELECT playlist_id, resume_token, complete, crawled_at FROM channel_crawls WHERE channel_id = ?',
+            (channel_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'playlist_id': row[0], 'resume_token': row[1], 'complete': bool(row[2]), 'crawled_at': row[3]}
+
+    def crawl_passes(self, crawl, resume=True):
+        """
+        The (start page token, backfill) passes a crawl should make. The first
+        crawl of a channel walks from the newest page as a backfill; later crawls
+        walk from the newest page until they reach a stored video, then, if the
+        backfill never finished, continue it from its resume token.
+        """
+        if crawl is None:
+            return [(None, True)]
+        passes = [(None, False)]
+        if resume and not crawl['complete'] and crawl['resume_token']:
+            passes.append((crawl['resume_token'], True))
+        return passes
+
+    def crawl(self, channel_id, playlist_id, fetch_page, max_pages=None, resume=True):
+        """
+        Walk a channel's uploads playlist into the store, making the passes
+        crawl_passes plans and stopping after max_pages pages. fetch_page(page_token)
+        fetches one playlist page and returns (videos, next page token).
+        Returns a summary dict.
+        """
+        pages = added = 0
+        for page_token, backfill in self.crawl_passes(self.get_crawl(channel_id), resume):
+            while max_pages is None or pages < max_pages:
+                videos, next_page_token = fetch_page(page_token)
+                pages += 1
+
+                page_added, page_token = self.save_page(channel_id, playlist_id, videos, next_page_token, backfill)
+                added += page_added
+                if not page_token:
+                    break
+
+        crawl = self.get_crawl(channel_id)
+        return {
+            'channel_id': channel_id,
+            'pages': pages,
+            'added': added,
+            'stored': self.count(channel_id),
+            'complete': crawl['complete'] if crawl else False
+        }
+
+    def save_page(self, channel_id, playlist_id, videos, next_page_token, backfill):
+        """
+        Store one page of uploads and return (added, token of the next page to
+        fetch or None when this pass is done).
+        """
+        conn = self._connection()
+        known = set()
+        if videos:
+            placeholders = ','.join('?' * len(videos))
+            known = {row[0] for row in conn.execute(
+                f'SELECT video_id FROM channel_videos WHERE channel_id = ? AND video_id IN ({placeholders})',
+                [channel_id] + [video['id'] for video in videos]
+            )}
+
+        new_videos = [video for video in videos if video['id'] not in known]
+        conn.executemany(
+            'INSERT OR IGNORE INTO channel_videos '
+            '(channel_id, video_id, published_at, title, description, thumbnail, channel) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (channel_id, video['id'], video['published_at'], video['title'], video['description'],
+                 video.get('thumbnail'), video.get('channel'))
+                for video in new_videos
+            ]
+        )
+
+        if backfill:
+            conn.execute(
+                'INSERT INTO channel_crawls (channel_id, playlist_id, resume_token, complete, crawled_at) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(channel_id) DO UPDATE SET playlist_id = excluded.playlist_id, '
+                'resume_token = excluded.resume_token, complete = excluded.complete, crawled_at = excluded.crawled_at',
+                (channel_id, playlist_id, next_page_token, next_page_token is None, time.time())
+            )
+            next_token = next_page_token
+        else:
+            conn.execute('UPDATE channel_crawls SET crawled_at = ? WHERE channel_id = ?', (time.time(), channel_id))
+            # Meeting a stored video means everything older is stored or left to the backfill
+            next_token = None if known else next_page_token
+
+        conn.commit()
+        return len(new_videos), next_token
+
+    def list_videos(self, channel_id, limit=50, offset=0):
+        """Stored uploads of a channel, newest first, shaped like playlist video results"""
+        rows = self._connection().execute(
+            'SELECT video_id, title, description, thumbnail, channel, published_at FROM channel_videos '
+            'WHERE channel_id = ? ORDER BY published_at DESC LIMIT ? OFFSET ?',
+            (channel_id, limit, offset)
+        ).fetchall()
+        return [
+            {'id': row[0], 'title': row[1], 'description': row[2], 'thumbnail': row[3],
+             'channel': row[4], 'published_at': row[5]}
+            for row in rows
+        ]
+
+    def count(self, channel_id):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM channel_videos WHERE channel_id = ?', (channel_id,)
+        ).fetchone()[0]
+
+
+class StatsStore(LocalStore):
+    """
+    Append-only statistics snapshots of tracked videos and channels. Each row is
+    one poll of one item: integer counts keyed by item and Unix time, clustered
+    by item so a series is a single range scan. Videos fill views, likes and
+    comments; channels fill views, subscribers and videos. Items YouTube did not
+    return are recorded as misses, so the tracker can back off from them.
+    """
+
+    COUNTS = ('views', 'likes', 'comments', 'subscribers', 'videos')
+
+    schema = (
+        'CREATE TABLE IF NOT EXISTS stat_snapshots ('
+        ' item_id TEXT NOT NULL,'
+        ' taken_at INTEGER NOT NULL,'
+        ' views INTEGER,'
+        ' likes INTEGER,'
+        ' comments INTEGER,'
+        ' subscribers INTEGER,'
+        ' videos INTEGER,'
+        ' PRIMARY KEY (item_id, taken_at)'
+        ') WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS stat_misses ('
+        ' item_id TEXT PRIMARY KEY,'
+        ' missed_at INTEGER NOT NULL,'
+        ' misses INTEGER NOT NULL'
+        ') WITHOUT ROWID',
+    )
+
+    def _snapshot(self, row):
+        snapshot = {'taken_at': row[0]}
+        snapshot.update((name, value) for name, value in zip(self.COUNTS, row[1:]) if value is not None)
+        return snapshot
+
+    def append(self, rows):
+        """Store (item_id, taken_at, views, likes, comments, subscribers, videos) rows"""
+        conn = self._connection()
+        conn.executemany('INSERT OR IGNORE INTO stat_snapshots VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        conn.commit()
+
+    def _by_item(self, query, item_ids):
+        """Run query, with an IN list of placeholders, over item_ids and map the
+        first column of each row to the second (or the rest of the row)"""
+        item_ids = list(item_ids)
+        conn = self._connection()
+        result = {}
+        # Stay under SQLite's default limit on bound parameters
+        for i in range(0, len(item_ids), 500):
+            chunk = item_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(query.format(placeholders=placeholders), chunk):
+                result[row[0]] = row[1] if len(row) == 2 else row[1:]
+        return result
+
+    def last_taken(self, item_ids):
+        """Map each item that has snapshots to the time of its latest one"""
+        return self._by_item(
+            'SELECT item_id, MAX(taken_at) FROM stat_snapshots WHERE item_id IN ({placeholders}) GROUP BY item_id',
+            item_ids
+        )
+
+    def record_misses(self, item_ids, missed_at):
+        """Count one more poll in a row that did not find each of item_ids"""
+        conn = self._connection()
+        conn.executemany(
+            'INSERT INTO stat_misses (item_id, missed_at, misses) VALUES (?, ?, 1) '
+            'ON CONFLICT(item_id) DO UPDATE SET missed_at = excluded.missed_at, misses = misses + 1',
+            [(item_id, missed_at) for item_id in item_ids]
+        )
+        conn.commit()
+
+    def clear_misses(self, item_ids):
+        conn = self._connection()
+        conn.executemany('DELETE FROM stat_misses WHERE item_id = ?', [(item_id,) for item_id in item_ids])
+        conn.commit()
+
+    def misses(self, item_ids):
+        """Map each item whose last polls missed it to (time of the last miss, misses in a row)"""
+        return self._by_item(
+            'SELECT item_id, missed_at, misses FROM stat_misses WHERE item_id IN ({placeholders})', item_ids
+        )
+
+    def latest(self, item_id, before=None):
+        """The newest snapshot of an item (taken at or before `before`), or None"""
+        row = self._connection().execute(
+            'SELECT taken_at, views, likes, comments, subscribers, videos FROM stat_snapshots '
+            'WHERE item_id = ? AND taken_at <= ? ORDER BY taken_at DESC LIMIT 1',
+            (item_id, before if before is not None else 2 ** 62)
+        ).fetchone()
+        return self._snapshot(row) if row else None
+
+    def earliest(self, item_id, since=0):
+        """The oldest snapshot of an item taken at or after `since`, or None"""
+        row = self._connection().execute(
+            'SELECT taken_at, views, likes, comments, subscribers, videos FROM stat_snapshots '
+            'WHERE item_id = ? AND taken_at >= ? ORDER BY taken_at LIMIT 1',
+            (item_id, since)
+        ).fetchone()
+        return self._snapshot(row) if row else None
+
+    def series(self, item_id, since, until, points=200):
+        """
+        Snapshots of an item between since and until, downsampled to at most
+        `points` evenly spaced buckets. Counts are cumulative, so each bucket
+        keeps its last snapshot.
+        """
+        step = max(1, -(-(until - since) // points))
+        # SQLite fills the other columns from the row holding MAX(taken_at)
+        rows = self._connection().execute(
+            'SELECT MAX(taken_at), views, likes, comments, subscribers, videos FROM stat_snapshots '
+            'WHERE item_id = ? AND taken_at >= ? AND taken_at <= ? '
+            'GROUP BY (taken_at - ?) / ? ORDER BY 1',
+            (item_id, since, until, since, step)
+        ).fetchall()
+        return [self._snapshot(row) for row in rows]
+
+
+class QuotaStore(LocalStore):
+    """
+    Data API quota units used per quota day, by method and feature. Every
+    process using the store charges the same rows, so the daily budget holds
+    across worker processes and restarts.
+    """
+
+    schema = (
+        'CREATE TABLE IF NOT EXISTS quota_usage ('
+        ' day TEXT NOT NULL,'
+        ' method TEXT NOT NULL,'
+        ' feature TEXT NOT NULL,'
+        ' units INTEGER NOT NULL,'
+        ' PRIMARY KEY (day, method, feature)'
+        ') WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS quota_exhausted ('
+        ' day TEXT PRIMARY KEY'
+        ') WITHOUT ROWID',
+    )
+
+    def charge(self, day, method, feature, units, budget):
+        """
+        Add units to the usage of day unless that would pass budget or the day
+        was marked exhausted. Returns (units used before, whether it was charged).
+        """
+        conn = self._connection()
+        # Take the write lock before reading, so two processes cannot both pass the check
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            used = conn.execute('SELECT COALESCE(SUM(units), 0) FROM quota_usage WHERE day = ?', (day,)).fetchone()[0]
+            exhausted = conn.execute('SELECT 1 FROM quota_exhausted WHERE day = ?', (day,)).fetchone()
+            if exhausted or used + units > budget:
+                conn.rollback()
+                return used, False
+
+            conn.execute(
+                'INSERT INTO quota_usage (day, method, feature, units) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(day, method, feature) DO UPDATE SET units = units + excluded.units',
+                (day, method, feature, units)
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return used, True
+
+    def mark_exhausted(self, day):
+        conn = self._connection()
+        conn.execute('INSERT OR IGNORE INTO quota_exhausted (day) VALUES (?)', (day,))
+        conn.commit()
+
+    def usage(self, day):
+        """(units used, whether day was marked exhausted, units by method, units by feature)"""
+        conn = self._connection()
+        by_method, by_feature = {}, {}
+        for method, feature, units in conn.execute(
+            'SELECT method, feature, units FROM quota_usage WHERE day = ?', (day,)
+        ):
+            by_method[method] = by_method.get(method, 0) + units
+            by_feature[feature] = by_feature.get(feature, 0) + units
+        exhausted = conn.execute('SELECT 1 FROM quota_exhausted WHERE day = ?', (day,)).fetchone() is not None
+        return sum(by_method.values()), exhausted, by_method, by_feature